@@ -13,29 +13,77 @@ import time
 import threading
 import queue
 import argparse
+import atexit
+import itertools
+import contextlib
+import functools
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from flask import Flask, render_template, request, flash, redirect, url_for, jsonify, send_file, Response
+from flask import Flask, render_template, request, flash, redirect, url_for, jsonify, Response, send_file
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
 import logging
-import io
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-from pydantic import BaseModel
-from typing import List, Dict
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # Optional: large CSVs fall back to the stdlib parser
+    pa = pa_csv = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # Optional: HTML-to-text falls back to regex tag stripping
+    LexborHTMLParser = None
+
+try:
+    import orjson
+except ImportError:  # Optional: JSON falls back to the stdlib json module
+    orjson = None
+
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes jsonify() responses and parses request JSON with orjson."""
+    
+    def dumps(self, obj, **kwargs):
+        # Datetimes go through Flask's default hook so they keep their HTTP date format
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 # Load environment variables
 load_dotenv(override=True)
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this')  # Use env variable
+if orjson is not None:
+    app.json = OrjsonJSONProvider(app)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 TEMPLATES_FOLDER = 'templates_saved'
+TEMPLATE_INDEX_FILENAME = '.index.json'  # leading dot can't clash with a saved template's filename
+LOGS_FOLDER = 'logs'
+LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', 30))  # days to keep campaign logs on disk
+CAMPAIGN_LOG_FIELDS = (
+    'campaign_id', 'timestamp', 'row_number', 'recipient_email',
+    'subject', 'status', 'error_message', 'sender_email', 'sender_name'
+)
 ALLOWED_EXTENSIONS = {'csv'}
+ALLOWED_SUFFIXES = tuple(f'.{extension}' for extension in ALLOWED_EXTENSIONS)  # for str.endswith
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+CSV_FAST_PARSE_MIN_BYTES = 1024 * 1024  # use pyarrow (if installed) for CSVs larger than 1MB
 
 # CUHK Email Server Configuration
 SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.googlemail.com')  # Default to Gmail SMTP
@@ -45,20 +93,81 @@ SMTP_PORT = os.getenv('SMTP_PORT', 587)  # Default SMTP port for TLS
 EMAIL_RATE_LIMIT_DELAY = os.getenv('EMAIL_RATE_LIMIT_DELAY', 2)  # seconds between emails
 EMAIL_BATCH_SIZE = os.getenv('EMAIL_BATCH_SIZE', 10)  # number of emails before longer pause
 EMAIL_BATCH_DELAY = os.getenv('EMAIL_BATCH_DELAY', 5)  # seconds to pause after each batch
+EMAIL_MAX_WORKERS = int(os.getenv('EMAIL_MAX_WORKERS', 4))  # concurrent SMTP connections per campaign
+EMAIL_RECIPIENTS_PER_MESSAGE = int(os.getenv('EMAIL_RECIPIENTS_PER_MESSAGE', 50))  # RCPT TOs per transaction for non-personalized campaigns
+CAMPAIGN_MAX_CONCURRENT = int(os.getenv('CAMPAIGN_MAX_CONCURRENT', 2))  # campaigns sending at once; later ones wait their turn
+PROGRESS_KEEPALIVE_SECONDS = 15  # idle time before a progress stream sends a keep-alive comment
+PROGRESS_NOTIFY_INTERVAL = 0.1  # minimum seconds between progress stream wake-ups while sending
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}  # keep proxies like nginx from buffering event streams
+CAMPAIGN_RESULTS_TTL_SECONDS = int(os.getenv('CAMPAIGN_RESULTS_TTL_SECONDS', 3600))  # how long finished campaigns stay in memory
+CAMPAIGN_RESULTS_MAX = int(os.getenv('CAMPAIGN_RESULTS_MAX', 256))  # finished campaigns kept in memory at most
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', 100))  # recycle a connection after this many messages
+SMTP_MAX_IDLE_SECONDS = int(os.getenv('SMTP_MAX_IDLE_SECONDS', 120))  # reopen connections left idle longer than this
 
 # Azure OpenAI Configuration
 AZURE_OPENAI_API_KEY = os.getenv('AZURE_OPENAI_API_KEY')
 AZURE_OPENAI_ENDPOINT = os.getenv('AZURE_OPENAI_ENDPOINT')
 AZURE_OPENAI_API_VERSION = os.getenv('AZURE_OPENAI_API_VERSION', '2025-01-01-preview')
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME', 'gpt-4o')
+AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT')  # Optional, enables semantic cache
+
+# Keep the HTTPS connection to Azure OpenAI open between AI requests
+AI_HTTP_MAX_KEEPALIVE = int(os.getenv('AI_HTTP_MAX_KEEPALIVE', 20))
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('AI_HTTP_KEEPALIVE_EXPIRY', 30.0))  # seconds
+
+# AI response caching configuration
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', 512))  # exact-match responses kept in memory
+AI_SEMANTIC_CACHE_SIZE = int(os.getenv('AI_SEMANTIC_CACHE_SIZE', 128))  # embeddings kept for similarity lookups
+AI_SEMANTIC_CACHE_THRESHOLD = float(os.getenv('AI_SEMANTIC_CACHE_THRESHOLD', 0.95))  # cosine similarity for a hit
+AI_CONNECTION_TEST_CACHE_SECONDS = 30  # how long /debug/azure_openai reuses its last connection test
+
+# Precompiled pattern for stripping HTML tags from email bodies
+HTML_TAG_RE = re.compile(r'<[^<]+?>')
+HTML_SKIP_RE = re.compile(r'<(script|style)\b.*?</\1\s*>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+
+# Loose address check run before sending; the SMTP server has the final say
+EMAIL_ADDRESS_RE = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+
+# Characters not allowed in saved template filenames
+UNSAFE_FILENAME_CHARS_RE = re.compile(r'[^a-zA-Z0-9_-]')
+
+# Pre-rendered MIME layout matching what MIMEMultipart produces for ASCII content
+MIME_BOUNDARY = '===============MassMailAlternative=='
+MAX_LINE_LENGTH = 998  # RFC 5322 limit, excluding CRLF
+TO_PLACEHOLDER = '%%TO%%'  # stands in for the recipient in cached message skeletons
+TO_PLACEHOLDER_BYTES = TO_PLACEHOLDER.encode('ascii')
+LINE_ENDING_RE = re.compile(r'\r\n|\r|\n')
+MIME_ALTERNATIVE_TEMPLATE = (
+    f'Content-Type: multipart/alternative; boundary="{MIME_BOUNDARY}"\n'
+    'MIME-Version: 1.0\n'
+    'From: {from_header}\n'
+    'To: {to_header}\n'
+    'Subject: {subject}\n'
+    '\n'
+    f'--{MIME_BOUNDARY}\n'
+    'Content-Type: text/plain; charset="us-ascii"\n'
+    'MIME-Version: 1.0\n'
+    'Content-Transfer-Encoding: 7bit\n'
+    '\n'
+    '{plain}\n'
+    f'--{MIME_BOUNDARY}\n'
+    'Content-Type: text/html; charset="us-ascii"\n'
+    'MIME-Version: 1.0\n'
+    'Content-Transfer-Encoding: 7bit\n'
+    '\n'
+    '{html}\n'
+    f'--{MIME_BOUNDARY}--\n'
+)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['TEMPLATES_FOLDER'] = TEMPLATES_FOLDER
+app.config['LOGS_FOLDER'] = LOGS_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
-# Create upload and templates directories if they don't exist
+# Create upload, templates and logs directories if they don't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(TEMPLATES_FOLDER, exist_ok=True)
+os.makedirs(LOGS_FOLDER, exist_ok=True)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -68,27 +177,68 @@ logger = logging.getLogger(__name__)
 campaign_progress = {}
 campaign_control = {}  # For pause/stop controls
 
-# Initialize Azure OpenAI client
-azure_openai_client = None
-if AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
-    try:
-        azure_openai_client = AzureOpenAI(
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=AZURE_OPENAI_API_VERSION,
-            azure_endpoint=AZURE_OPENAI_ENDPOINT
-        )
-        logger.info(f"Azure OpenAI client initialized successfully with endpoint: {AZURE_OPENAI_ENDPOINT}")
-        logger.info(f"Using deployment: {AZURE_OPENAI_DEPLOYMENT_NAME}")
-        logger.info(f"API Version: {AZURE_OPENAI_API_VERSION}")
-    except Exception as e:
-        logger.error(f"Failed to initialize Azure OpenAI client: {str(e)}")
-        azure_openai_client = None
-else:
+# Notified whenever a campaign's progress changes; progress streams wait on these
+campaign_events = {}
+campaign_payloads = {}  # campaign_id -> (version, progress snapshot, its serialized JSON) as last published
+
+# Finished campaigns, oldest first: campaign_id -> (expiry time, results or None if the campaign failed)
+finished_campaigns = OrderedDict()
+_finished_campaigns_lock = threading.Lock()
+
+# Campaigns run here instead of on ad-hoc threads; extra campaigns queue until a slot frees up
+campaign_executor = ThreadPoolExecutor(max_workers=max(1, CAMPAIGN_MAX_CONCURRENT),
+                                       thread_name_prefix='campaign')
+
+# Serializes template index rebuilds and read-modify-write updates; re-entrant because
+# an update may trigger a rebuild when the index is missing
+_template_index_lock = threading.RLock()
+
+# Successful AI improvement responses, keyed by (subject, body, context)
+_ai_response_cache = OrderedDict()
+_ai_semantic_cache = []  # list of (embedding, response) pairs, oldest first
+_ai_cache_lock = threading.Lock()
+
+# Last Azure OpenAI connection test result and when it expires (monotonic time)
+_connection_test_cache = {'result': None, 'expires_at': 0.0}
+_connection_test_lock = threading.Lock()
+
+# Azure OpenAI client, created on first use so the SDK is only imported once AI features are used
+_azure_openai_client = None
+_azure_openai_client_lock = threading.Lock()
+if not (AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT):
     logger.warning("Azure OpenAI credentials not found. AI features will be disabled.")
 
 
+def get_azure_openai_client():
+    """Return the shared Azure OpenAI client, or None if it is not configured or fails to initialize."""
+    global _azure_openai_client
+    if _azure_openai_client is None and AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
+        with _azure_openai_client_lock:
+            if _azure_openai_client is None:
+                try:
+                    import httpx
+                    from openai import AzureOpenAI, DefaultHttpxClient
+                    
+                    _azure_openai_client = AzureOpenAI(
+                        api_key=AZURE_OPENAI_API_KEY,
+                        api_version=AZURE_OPENAI_API_VERSION,
+                        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                        http_client=DefaultHttpxClient(limits=httpx.Limits(
+                            max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=AI_HTTP_KEEPALIVE_EXPIRY
+                        ))
+                    )
+                    logger.info(f"Azure OpenAI client initialized successfully with endpoint: {AZURE_OPENAI_ENDPOINT}")
+                    logger.info(f"Using deployment: {AZURE_OPENAI_DEPLOYMENT_NAME}")
+                    logger.info(f"API Version: {AZURE_OPENAI_API_VERSION}")
+                except Exception as e:
+                    logger.error(f"Failed to initialize Azure OpenAI client: {str(e)}")
+    return _azure_openai_client
+
+
 def test_azure_openai_connection():
     """Test Azure OpenAI connection and deployment availability."""
+    azure_openai_client = get_azure_openai_client()
     if not azure_openai_client:
         return False, "Azure OpenAI client not initialized"
     
@@ -113,107 +263,487 @@ def test_azure_openai_connection():
             return False, f"Connection failed: {error_msg}"
 
 
+def get_azure_openai_connection_status():
+    """Return the result of test_azure_openai_connection(), reusing it for a few seconds.
+    
+    Concurrent callers wait for the test already in flight instead of starting their own.
+    """
+    with _connection_test_lock:
+        now = time.monotonic()
+        if _connection_test_cache['result'] is None or now >= _connection_test_cache['expires_at']:
+            _connection_test_cache['result'] = test_azure_openai_connection()
+            _connection_test_cache['expires_at'] = time.monotonic() + AI_CONNECTION_TEST_CACHE_SECONDS
+        return _connection_test_cache['result']
+
+
+def json_default(value):
+    """Serialize values the JSON encoders don't handle natively (datetimes)."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_dumps(data):
+    """Serialize data to a compact JSON string, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, default=json_default).decode('utf-8')
+    return json.dumps(data, default=json_default)
+
+
+def json_loads(content):
+    """Parse a JSON string or bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def read_json_file(filepath):
+    """Parse a UTF-8 JSON file."""
+    with open(filepath, 'rb') as f:
+        return json_loads(f.read())
+
+
+def write_json_file(filepath, data):
+    """Write data to a file as indented UTF-8 JSON."""
+    if orjson is not None:
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
 def allowed_file(filename):
     """Check if the uploaded file has an allowed extension."""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(ALLOWED_SUFFIXES)
 
 
-def validate_csv(filepath):
-    """Validate CSV file format and return column names."""
+def iter_arrow_csv_rows(filepath, headers, fallback_rows):
+    """Yield CSV data rows as tuples of strings using pyarrow's multithreaded parser.
+    
+    pyarrow rejects rows with a different number of fields than the header, so on a
+    parse error the remaining rows are taken from ``fallback_rows`` (a stdlib reader
+    positioned after the header) instead.
+    """
+    yielded = 0
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            csv_reader = csv.reader(file)
-            headers = next(csv_reader)
-            
-            # Check if email column exists
-            email_columns = [col for col in headers if 'email' in col.lower()]
-            if not email_columns:
-                return False, "CSV must contain an 'email' column"
-            
-            return True, headers
-    except Exception as e:
-        return False, f"Error reading CSV file: {str(e)}"
+        reader = pa_csv.open_csv(
+            filepath,
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            # Keep every column as text so values like "007" aren't converted to numbers
+            convert_options=pa_csv.ConvertOptions(column_types={header: pa.string() for header in headers})
+        )
+        for batch in reader:
+            columns = [column.to_pylist() for column in batch.columns]
+            for values in zip(*columns):
+                yield values
+                yielded += 1
+    except pa.ArrowInvalid as e:
+        logger.warning(f"pyarrow could not parse {filepath}, continuing with the csv module: {str(e)}")
+        yield from itertools.islice(fallback_rows, yielded, None)
+
+
+@contextlib.contextmanager
+def open_validated_csv(filepath):
+    """Open a CSV file once, validate its header and yield (headers, rows).
+    
+    ``rows`` is an iterator over the remaining non-empty data rows as sequences,
+    valid until the ``with`` block exits. Raises ValueError for an invalid header.
+    Large files are parsed with pyarrow when it is installed.
+    """
+    with open(filepath, 'r', encoding='utf-8') as file:
+        rows = (row for row in csv.reader(file) if row)
+        headers = next(rows, None)
+        if not headers:
+            raise ValueError("CSV file is empty")
+        
+        # Check if email column exists
+        if not any('email' in col.lower() for col in headers):
+            raise ValueError("CSV must contain an 'email' column")
+        
+        if pa_csv is not None and os.path.getsize(filepath) > CSV_FAST_PARSE_MIN_BYTES:
+            rows = iter_arrow_csv_rows(filepath, headers, rows)
+        
+        try:
+            yield headers, rows
+        finally:
+            rows.close()
 
 
-def read_csv_data(filepath):
-    """Read CSV data and return list of dictionaries."""
-    data = []
-    try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                data.append(row)
-        return data
-    except Exception as e:
-        logger.error(f"Error reading CSV data: {str(e)}")
-        return []
+def build_placeholder_index(headers):
+    """Map each CSV column name to its position in a data row."""
+    return {header: index for index, header in enumerate(headers)}
 
 
-def send_email(smtp_server, smtp_port, sender_email, recipient_email, subject, body, sender_name=None, is_html=True, smtp_connection=None):
-    """Send individual email using SMTP with optional connection reuse."""
-    try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['From'] = f"{sender_name} <{sender_email}>" if sender_name else sender_email
-        msg['To'] = recipient_email
-        msg['Subject'] = subject
+def compile_placeholder_pattern(headers):
+    """Compile one regex matching every {column} placeholder for the given headers."""
+    return re.compile(r"\{(" + "|".join(re.escape(header) for header in headers) + r")\}")
+
+
+def html_to_plain_text(body):
+    """Convert an HTML body to a plain text fallback.
+    
+    Uses selectolax when it is installed; otherwise strips tags with regexes.
+    Script/style contents and comments are dropped either way.
+    """
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(body)
+        for node in tree.css('script, style'):
+            node.decompose()
+        return tree.text()
+    
+    plain_text = HTML_SKIP_RE.sub('', body)
+    plain_text = HTML_TAG_RE.sub('', plain_text)  # Simple HTML tag removal
+    return html.unescape(plain_text)  # Decode HTML entities
+
+
+def render_alternative_message(from_header, to_header, subject, plain_text, body):
+    """Render a multipart/alternative message directly from a string template.
+    
+    Returns None when the content needs the email package instead: non-ASCII text,
+    line breaks in a header, lines over the RFC 5322 length limit, or a body that
+    contains the boundary.
+    """
+    headers = (from_header, to_header, subject)
+    if any('\n' in value or '\r' in value for value in headers):
+        return None
+    
+    message = MIME_ALTERNATIVE_TEMPLATE.format(from_header=from_header, to_header=to_header,
+                                               subject=subject, plain=plain_text, html=body)
+    if (not message.isascii()
+            or MIME_BOUNDARY in plain_text or MIME_BOUNDARY in body
+            or any(len(line) > MAX_LINE_LENGTH for line in message.splitlines())):
+        return None
+    return message
+
+
+def build_message(sender_email, recipient_email, subject, body, sender_name=None, is_html=True, plain_text=None):
+    """Build a MIME message for a single recipient and return it as a string.
+    
+    When ``plain_text`` is given it is used as the text/plain alternative instead of
+    deriving it from ``body``.
+    """
+    from_header = f"{sender_name} <{sender_email}>" if sender_name else sender_email
+    if is_html:
+        if plain_text is None:
+            plain_text = html_to_plain_text(body)
         
-        # Create HTML and plain text versions
-        if is_html:
-            # Convert HTML to plain text for fallback
-            plain_text = re.sub('<[^<]+?>', '', body)  # Simple HTML tag removal
-            plain_text = html.unescape(plain_text)  # Decode HTML entities
-            
-            # Create both parts
-            text_part = MIMEText(plain_text, 'plain')
-            html_part = MIMEText(body, 'html')
-            
-            # Add parts to message
-            msg.attach(text_part)
-            msg.attach(html_part)
-        else:
-            # Plain text only
-            msg.attach(MIMEText(body, 'plain'))
+        # Plain ASCII content skips the (slow) email package entirely
+        message = render_alternative_message(from_header, recipient_email, subject, plain_text, body)
+        if message is not None:
+            return message
+    
+    msg = MIMEMultipart('alternative')
+    msg['From'] = from_header
+    msg['To'] = recipient_email
+    msg['Subject'] = subject
+    
+    # Create HTML and plain text versions
+    if is_html:
+        # Create both parts
+        text_part = MIMEText(plain_text, 'plain')
+        html_part = MIMEText(body, 'html')
         
-        # Use provided connection or create new one
-        if smtp_connection:
-            server = smtp_connection
-            server.sendmail(sender_email, recipient_email, msg.as_string())
-        else:
-            # Connect to server and send email (single email mode)
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.sendmail(sender_email, recipient_email, msg.as_string())
+        # Add parts to message
+        msg.attach(text_part)
+        msg.attach(html_part)
+    else:
+        # Plain text only
+        msg.attach(MIMEText(body, 'plain'))
+    
+    return msg.as_string()
+
+
+@functools.lru_cache(maxsize=32)
+def build_message_skeleton(sender_email, subject, body, sender_name=None, plain_text=None):
+    """Build an HTML message whose To: header is a placeholder, cached per content.
+    
+    The message is returned as ASCII bytes with CRLF line endings, the form smtplib
+    would otherwise convert a string message to on every send. Campaigns that send
+    the same subject and body to everyone serialize and encode the MIME message once;
+    address_message fills in each recipient.
+    """
+    message = build_message(sender_email, TO_PLACEHOLDER, subject, body, sender_name,
+                            is_html=True, plain_text=plain_text)
+    return LINE_ENDING_RE.sub('\r\n', message).encode('ascii')
+
+
+def address_message(skeleton, to_header):
+    """Fill the To: header of a message built by build_message_skeleton."""
+    if '\n' in to_header or '\r' in to_header:
+        raise ValueError(f"Invalid recipient address: {to_header!r}")
+    return skeleton.replace(TO_PLACEHOLDER_BYTES, to_header.encode('ascii'), 1)
+
+
+def open_smtp_connection(smtp_server, smtp_port):
+    """Open an SMTP connection and greet the server once with EHLO."""
+    server = smtplib.SMTP(smtp_server, smtp_port)
+    server.ehlo()
+    return server
+
+
+def send_via(server, sender_email, recipients, msg_str):
+    """Send an already-built message (string or encoded bytes) over an open SMTP connection.
+    
+    ``recipients`` may be a single address or a list sharing one SMTP transaction.
+    Returns the dict of refused recipients reported by the server.
+    """
+    return server.sendmail(sender_email, recipients, msg_str)
+
+
+class CampaignControl:
+    """Pause/stop state for a campaign; ``wakeup`` is set whenever it changes."""
+    
+    __slots__ = ('paused', 'stopped', 'wakeup')
+    
+    def __init__(self):
+        self.paused = False
+        self.stopped = False
+        self.wakeup = threading.Event()
+    
+    def pause(self):
+        self.paused = True
+        self.wakeup.set()
+    
+    def resume(self):
+        self.paused = False
+        self.wakeup.set()
+    
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+
+
+def shutdown_campaigns():
+    """Drop queued campaigns and stop running ones so the process can exit promptly."""
+    campaign_executor.shutdown(wait=False, cancel_futures=True)
+    for control in list(campaign_control.values()):
+        control.stop()
+
+
+# The executor's worker threads are joined by threading's exit hooks, which run before
+# atexit handlers; register there when possible so campaigns are stopped first
+getattr(threading, '_register_atexit', atexit.register)(shutdown_campaigns)
+
+
+def notify_progress(campaign_id):
+    """Publish a campaign's current progress and wake every progress stream watching it.
+    
+    The snapshot is serialized here, once per change, so streams only forward the
+    cached JSON no matter how many clients are watching. Each published change gets
+    a new version number; republishing an unchanged snapshot is a no-op.
+    """
+    if campaign_id not in campaign_progress:
+        return
+    condition = campaign_events.setdefault(campaign_id, threading.Condition())
+    with condition:
+        # Snapshot under the lock so concurrent publishers can't store an older state last
+        snapshot = campaign_progress[campaign_id].copy()
+        payload = json_dumps(snapshot)
+        version, _, last_payload = campaign_payloads.get(campaign_id, (0, None, None))
+        if payload == last_payload:
+            return
+        campaign_payloads[campaign_id] = (version + 1, snapshot, payload)
+        condition.notify_all()
+
+
+def forget_campaign(campaign_id):
+    """Drop the progress, controls and stream state kept in memory for a campaign."""
+    for state in (campaign_progress, campaign_control, campaign_payloads, campaign_events):
+        state.pop(campaign_id, None)
+
+
+def expire_finished_campaigns():
+    """Forget finished campaigns past their TTL or beyond CAMPAIGN_RESULTS_MAX.
+    
+    Callers must hold ``_finished_campaigns_lock``. Entries share one TTL, so the
+    oldest entry is always the first to expire.
+    """
+    now = time.monotonic()
+    while finished_campaigns:
+        campaign_id, (expires_at, _) = next(iter(finished_campaigns.items()))
+        if expires_at > now and len(finished_campaigns) <= CAMPAIGN_RESULTS_MAX:
+            break
+        del finished_campaigns[campaign_id]
+        forget_campaign(campaign_id)
+
+
+def store_campaign_results(campaign_id, results):
+    """Keep a finished campaign's results until they expire."""
+    with _finished_campaigns_lock:
+        finished_campaigns[campaign_id] = (time.monotonic() + CAMPAIGN_RESULTS_TTL_SECONDS, results)
+        finished_campaigns.move_to_end(campaign_id)
+        expire_finished_campaigns()
+
+
+def get_campaign_results(campaign_id):
+    """Return a finished campaign's results, or None if unknown, expired or failed."""
+    with _finished_campaigns_lock:
+        expire_finished_campaigns()
+        entry = finished_campaigns.get(campaign_id)
+    return entry[1] if entry else None
+
+
+class SMTPConnectionPool:
+    """
+    Persistent SMTP connections shared by the delivery threads of one campaign.
+    
+    Connections are opened on demand and handed back after each message. A connection
+    is closed once it has sent ``max_messages`` messages, and an idle connection older
+    than ``max_idle`` seconds is replaced rather than reused, since servers drop
+    connections that sit idle.
+    """
+    
+    def __init__(self, smtp_server, smtp_port, max_messages=SMTP_MAX_MESSAGES_PER_CONNECTION,
+                 max_idle=SMTP_MAX_IDLE_SECONDS):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.max_messages = max(1, max_messages)
+        self.max_idle = max_idle
+        self._idle = queue.Queue()  # (connection, last used) pairs
+        self._sent = {}  # open connection -> messages sent on it
+        self._lock = threading.Lock()
+        self.opened = 0
+    
+    def _open(self):
+        server = open_smtp_connection(self.smtp_server, self.smtp_port)
+        with self._lock:
+            self._sent[server] = 0
+            self.opened += 1
+        return server
+    
+    def _close(self, server):
+        with self._lock:
+            self._sent.pop(server, None)
+        try:
             server.quit()
-        
-        return True, "Email sent successfully"
-    except Exception as e:
-        error_msg = f"Failed to send email to {recipient_email}: {str(e)}"
-        logger.error(error_msg)
-        return False, error_msg
+        except Exception as e:
+            logger.warning(f"Error closing SMTP connection: {str(e)}")
+    
+    def prefill(self):
+        """Open one connection up front so an unreachable server fails fast."""
+        self._idle.put((self._open(), time.monotonic()))
+    
+    def acquire(self):
+        """Return an idle connection, opening a new one if none is fresh enough."""
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            if time.monotonic() - last_used <= self.max_idle:
+                return server
+            self._close(server)
+    
+    def replace(self, server):
+        """Discard a dropped connection and return a newly opened one."""
+        self._close(server)
+        return self._open()
+    
+    def release(self, server):
+        """Hand a connection back after one message, recycling it once it is used up."""
+        with self._lock:
+            self._sent[server] = self._sent.get(server, 0) + 1
+            used_up = self._sent[server] >= self.max_messages
+        if used_up:
+            self._close(server)
+        else:
+            self._idle.put((server, time.monotonic()))
+    
+    def close(self):
+        """Close every open connection."""
+        with self._lock:
+            servers = list(self._sent)
+        for server in servers:
+            self._close(server)
+        if self.opened:
+            logger.info(f"Opened {self.opened} SMTP connection(s) during campaign, closed {len(servers)} at the end")
 
 
-def send_batch_emails_with_progress(smtp_server, smtp_port, sender_email, email_data_list, 
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by the delivery threads of one campaign.
+    
+    Tokens accrue at ``fill_rate`` per second up to ``capacity``. Bursts of up to
+    ``capacity`` sends go out immediately, while the long-run rate never exceeds
+    ``fill_rate`` however many threads draw from the bucket.
+    """
+    
+    def __init__(self, capacity, fill_rate):
+        self.capacity = max(1, capacity)
+        self.fill_rate = fill_rate
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, n=1):
+        """Take ``n`` tokens, sleeping until they have accrued.
+        
+        Tokens are reserved before sleeping, so waiting threads are served in order.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.fill_rate)
+            self.last_refill = now
+            self.tokens -= n
+            wait = -self.tokens / self.fill_rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def send_batch_emails_with_progress(smtp_server, smtp_port, sender_email, emails, 
                                    sender_name=None, rate_limit_delay=2, batch_size=10, 
-                                   batch_delay=10, campaign_id=None):
+                                   batch_delay=10, campaign_id=None, max_workers=EMAIL_MAX_WORKERS,
+                                   recipients_per_message=1, on_result=None, total_emails=None,
+                                   identical_emails=False):
     """
-    Send multiple emails with rate limiting, connection reuse, and progress tracking.
+    Send multiple emails with rate limiting, pooled connection reuse, and progress tracking.
+    
+    Emails are pulled from ``emails`` lazily and dispatched in order from the calling
+    thread, which applies the pause/stop controls, and delivered by a pool of worker
+    threads that share a set of persistent SMTP connections. Workers draw from one
+    token bucket that allows bursts of ``batch_size`` recipients at the long-run rate of
+    ``batch_size`` recipients every ``batch_size * rate_limit_delay + batch_delay`` seconds.
+    When every email has the same subject and body, ``recipients_per_message``
+    consecutive recipients are sent in one SMTP transaction addressed to undisclosed
+    recipients; the transaction takes one token per recipient.
     
     Args:
         smtp_server: SMTP server address
         smtp_port: SMTP server port
         sender_email: Sender's email address
-        email_data_list: List of dicts with 'recipient', 'subject', 'body' keys
+        emails: Iterable of dicts with 'recipient', 'subject', 'body' keys
         sender_name: Sender's display name
-        rate_limit_delay: Seconds to wait between individual emails
-        batch_size: Number of emails before taking a longer break
-        batch_delay: Seconds to wait after each batch
+        rate_limit_delay: Average seconds between individual emails
+        batch_size: Largest burst of emails sent without waiting
+        batch_delay: Extra seconds added per batch_size emails
         campaign_id: Campaign ID for progress tracking
+        max_workers: Maximum number of concurrent SMTP connections
+        recipients_per_message: Recipients per SMTP transaction (only for identical emails)
+        on_result: Optional callable ``on_result(email_data, success, message)`` run once per
+            email as soon as its outcome is known (calls are serialized)
+        total_emails: Number of emails, for progress reporting (defaults to ``len(emails)``)
+        identical_emails: True when every email has the same subject and body, so the
+            serialized message is cached and reused for each recipient
     
     Returns:
         List of tuples: (success, message, recipient_email) for each email
     """
     results = []
-    smtp_connection = None
+    futures = []
+    pool = SMTPConnectionPool(smtp_server, smtp_port)
+    batch_size = max(1, batch_size)
+    batch_period = batch_size * rate_limit_delay + batch_delay
+    rate_limiter = TokenBucket(batch_size, batch_size / batch_period) if batch_period > 0 else None
+    progress_lock = threading.Lock()
+    max_workers = max(1, max_workers)
+    recipients_per_message = max(1, recipients_per_message)
+    in_flight = threading.BoundedSemaphore(max_workers)
+    last_notified = [0.0]  # monotonic time progress streams were last woken by a delivery
+    pending_group = []
+    if total_emails is None:
+        total_emails = len(emails)
+    email_iter = iter(emails)
     
     # Initialize progress tracking
     if campaign_id:
@@ -221,7 +751,7 @@ def send_batch_emails_with_progress(smtp_server, smtp_port, sender_email, email_
             'progress': 0,
             'success_count': 0,
             'failure_count': 0,
-            'total_emails': len(email_data_list),
+            'total_emails': total_emails,
             'status': 'Initializing SMTP connection...',
             'activity': None,
             'activity_type': 'info',
@@ -229,89 +759,174 @@ def send_batch_emails_with_progress(smtp_server, smtp_port, sender_email, email_
             'start_time': datetime.now()
         }
         
-        campaign_control[campaign_id] = {
-            'paused': False,
-            'stopped': False
-        }
+        # Keep controls set while the campaign was queued (e.g. stopped before it started)
+        control = campaign_control.setdefault(campaign_id, CampaignControl())
+        notify_progress(campaign_id)
+    else:
+        control = None
+    
+    def deliver(email_group):
+        """Send one message on a pooled connection and record each recipient's outcome."""
+        recipients = [email_data['recipient'] for email_data in email_group]
+        first_email = email_group[0]
+        # A shared message can't carry each address in To:, so address it to nobody
+        to_header = recipients[0] if len(recipients) == 1 else 'undisclosed-recipients:;'
+        server = None
+        refused = {}
+        error = None
+        cancelled = False
+        try:
+            # Identical emails reuse one serialized message; only the To: header changes.
+            # Personalized emails are never sent twice, so caching them would only churn the cache
+            if identical_emails:
+                skeleton = build_message_skeleton(sender_email, first_email['subject'], first_email['body'],
+                                                  sender_name, first_email.get('plain_body'))
+                msg_str = address_message(skeleton, to_header)
+            else:
+                msg_str = build_message(sender_email, to_header, first_email['subject'], first_email['body'],
+                                        sender_name, is_html=True, plain_text=first_email.get('plain_body'))
+            # Pace recipients, not messages, so grouped sends honour the configured rate
+            if rate_limiter:
+                rate_limiter.acquire(len(recipients))
+            
+            # Stop may have been pressed while this worker waited for tokens
+            if control is not None and control.stopped:
+                cancelled = True
+            else:
+                server = pool.acquire()
+                
+                # Reconnect once if the server dropped an idle connection
+                try:
+                    refused = send_via(server, sender_email, recipients, msg_str)
+                except smtplib.SMTPServerDisconnected:
+                    logger.warning(f"SMTP connection lost, reconnecting to {smtp_server}:{smtp_port}")
+                    dropped, server = server, None
+                    server = pool.replace(dropped)
+                    refused = send_via(server, sender_email, recipients, msg_str)
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        except Exception as e:
+            error = str(e)
+            # Reset the SMTP transaction so a failed message doesn't poison the next one
+            if server is not None:
+                try:
+                    server.rset()
+                except smtplib.SMTPException as rset_error:
+                    logger.warning(f"SMTP RSET failed: {str(rset_error)}")
+        finally:
+            if server is not None:
+                pool.release(server)
+        
+        outcomes = []
+        for email_data in email_group:
+            recipient_email = email_data['recipient']
+            if cancelled:
+                success, message = False, f"Not sent to {recipient_email}: campaign stopped by user"
+            elif error is not None:
+                success, message = False, f"Failed to send email to {recipient_email}: {error}"
+            elif recipient_email in refused:
+                code, response = refused[recipient_email]
+                reason = response.decode('utf-8', 'replace') if isinstance(response, bytes) else response
+                success, message = False, f"Failed to send email to {recipient_email}: ({code}, {reason})"
+            else:
+                success, message = True, "Email sent successfully"
+            if not success:
+                logger.error(message)
+            outcomes.append((success, message, recipient_email))
+        
+        # Record the whole group under one lock acquisition
+        with progress_lock:
+            if on_result:
+                for email_data, (success, message, _) in zip(email_group, outcomes):
+                    on_result(email_data, success, message)
+            
+            # Update progress tracking
+            if campaign_id:
+                sent_count = len(outcomes)
+                success_count = sum(1 for success, _, _ in outcomes if success)
+                progress = campaign_progress[campaign_id]
+                progress['progress'] += sent_count
+                progress['success_count'] += success_count
+                progress['failure_count'] += sent_count - success_count
+                
+                success, message, recipient_email = outcomes[-1]
+                if success:
+                    progress['activity'] = f'✓ Email sent successfully to {recipient_email}'
+                    progress['activity_type'] = 'success'
+                else:
+                    progress['activity'] = f'✗ Failed to send to {recipient_email}: {message}'
+                    progress['activity_type'] = 'error'
+                
+                # Wake progress streams at most every PROGRESS_NOTIFY_INTERVAL; the final
+                # update is always sent when the campaign finishes
+                now = time.monotonic()
+                if now - last_notified[0] >= PROGRESS_NOTIFY_INTERVAL:
+                    last_notified[0] = now
+                    notify_progress(campaign_id)
+        return outcomes
     
     try:
-        # Create persistent SMTP connection
-        smtp_connection = smtplib.SMTP(smtp_server, smtp_port)
+        # Open the first connection up front so an unreachable server fails fast
+        pool.prefill()
         logger.info(f"Established SMTP connection to {smtp_server}:{smtp_port}")
         
         if campaign_id:
             campaign_progress[campaign_id]['status'] = 'SMTP connection established. Starting to send emails...'
             campaign_progress[campaign_id]['activity'] = f'Connected to {smtp_server}:{smtp_port}'
+            notify_progress(campaign_id)
         
-        total_emails = len(email_data_list)
+        # Pull emails lazily so only messages about to be sent are held in memory
+        email_groups = iter(lambda: list(itertools.islice(email_iter, recipients_per_message)), [])
+        dispatched = 0
         
-        for index, email_data in enumerate(email_data_list, 1):
-            # Check for pause/stop controls
-            if campaign_id and campaign_id in campaign_control:
-                # Handle pause
-                while campaign_control[campaign_id].get('paused', False):
-                    if campaign_id in campaign_progress:
-                        campaign_progress[campaign_id]['status'] = 'Campaign paused by user'
-                        campaign_progress[campaign_id]['activity'] = 'Campaign paused - waiting for resume'
-                        campaign_progress[campaign_id]['activity_type'] = 'warning'
-                    time.sleep(1)  # Check every second
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for index, email_group in enumerate(email_groups, 1):
+                # Check for pause/stop controls
+                if control is not None:
+                    # Handle pause: block until resume or stop changes the controls
+                    while control.paused and not control.stopped:
+                        if campaign_id in campaign_progress:
+                            campaign_progress[campaign_id]['status'] = 'Campaign paused by user'
+                            campaign_progress[campaign_id]['activity'] = 'Campaign paused - waiting for resume'
+                            campaign_progress[campaign_id]['activity_type'] = 'warning'
+                            notify_progress(campaign_id)
+                        control.wakeup.wait()
+                        control.wakeup.clear()
+                    
+                    # Handle stop
+                    if control.stopped:
+                        if campaign_id in campaign_progress:
+                            campaign_progress[campaign_id]['status'] = 'Campaign stopped by user'
+                            campaign_progress[campaign_id]['activity'] = 'Campaign stopped - remaining emails cancelled'
+                            campaign_progress[campaign_id]['activity_type'] = 'warning'
+                            notify_progress(campaign_id)
+                        logger.info(f"Campaign {campaign_id} stopped by user at email {dispatched + 1}/{total_emails}")
+                        break
                 
-                # Handle stop
-                if campaign_control[campaign_id].get('stopped', False):
-                    if campaign_id in campaign_progress:
-                        campaign_progress[campaign_id]['status'] = 'Campaign stopped by user'
-                        campaign_progress[campaign_id]['activity'] = 'Campaign stopped - remaining emails cancelled'
-                        campaign_progress[campaign_id]['activity_type'] = 'warning'
-                    logger.info(f"Campaign {campaign_id} stopped by user at email {index}/{total_emails}")
-                    break
-            
-            recipient_email = email_data['recipient']
-            subject = email_data['subject']
-            body = email_data['body']
-            
-            # Update progress with current email
-            if campaign_id:
-                campaign_progress[campaign_id]['current_email'] = recipient_email
-                campaign_progress[campaign_id]['status'] = f'Sending email {index}/{total_emails} to {recipient_email}'
-            
-            # Send email using persistent connection
-            success, message = send_email(
-                smtp_server, smtp_port, sender_email, recipient_email,
-                subject, body, sender_name, is_html=True, smtp_connection=smtp_connection
-            )
-            
-            results.append((success, message, recipient_email))
-            
-            # Update progress tracking
-            if campaign_id:
-                campaign_progress[campaign_id]['progress'] = index
-                if success:
-                    campaign_progress[campaign_id]['success_count'] += 1
-                    campaign_progress[campaign_id]['activity'] = f'✓ Email sent successfully to {recipient_email}'
-                    campaign_progress[campaign_id]['activity_type'] = 'success'
-                else:
-                    campaign_progress[campaign_id]['failure_count'] += 1
-                    campaign_progress[campaign_id]['activity'] = f'✗ Failed to send to {recipient_email}: {message}'
-                    campaign_progress[campaign_id]['activity_type'] = 'error'
-            
-            # Log progress
-            if index % 10 == 0 or index == total_emails:
-                logger.info(f"Campaign {campaign_id}: Sent {index}/{total_emails} emails")
-            
-            # Rate limiting: pause between emails
-            if index < total_emails:  # Don't pause after the last email
-                time.sleep(rate_limit_delay)
-                logger.debug(f"Waiting {rate_limit_delay}s before next email")
-            
-            # Batch delay: longer pause after every batch_size emails
-            if index % batch_size == 0 and index < total_emails:
+                pending_group = email_group
+                dispatched += len(email_group)
+                recipient_email = email_group[0]['recipient']
+                if len(email_group) > 1:
+                    recipient_email = f"{recipient_email} and {len(email_group) - 1} more"
+                
+                # Update progress with current email
                 if campaign_id:
-                    campaign_progress[campaign_id]['status'] = f'Completed batch of {batch_size} emails. Taking {batch_delay}s break...'
-                    campaign_progress[campaign_id]['activity'] = f'Batch completed ({index}/{total_emails}). Taking {batch_delay}s break...'
-                    campaign_progress[campaign_id]['activity_type'] = 'info'
+                    campaign_progress[campaign_id]['current_email'] = recipient_email
+                    campaign_progress[campaign_id]['status'] = f'Sending email {dispatched}/{total_emails} to {recipient_email}'
+                    notify_progress(campaign_id)
+                
+                # Wait for a free worker so pause/stop still take effect promptly
+                in_flight.acquire()
+                future = executor.submit(deliver, email_group)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+                pending_group = []
                 
-                logger.info(f"Completed batch of {batch_size} emails. Taking {batch_delay}s break...")
-                time.sleep(batch_delay)
+                # Log progress
+                if index % 10 == 0 or dispatched == total_emails:
+                    logger.info(f"Campaign {campaign_id}: Dispatched {dispatched}/{total_emails} emails")
+        
+        results = [outcome for future in futures for outcome in future.result()]
         
     except Exception as e:
         logger.error(f"Error in batch email sending: {str(e)}")
@@ -320,63 +935,94 @@ def send_batch_emails_with_progress(smtp_server, smtp_port, sender_email, email_
             campaign_progress[campaign_id]['status'] = f'SMTP connection error: {str(e)}'
             campaign_progress[campaign_id]['activity'] = f'Connection error: {str(e)}'
             campaign_progress[campaign_id]['activity_type'] = 'error'
+            notify_progress(campaign_id)
         
-        # If connection failed, mark remaining emails as failed
-        remaining_emails = email_data_list[len(results):]
-        for email_data in remaining_emails:
-            results.append((False, f"SMTP connection error: {str(e)}", email_data['recipient']))
+        # Keep results for emails already handed to workers, mark the rest as failed
+        results = [outcome for future in futures for outcome in future.result()]
+        message = f"SMTP connection error: {str(e)}"
+        for email_data in itertools.chain(pending_group, email_iter):
+            results.append((False, message, email_data['recipient']))
+            if on_result:
+                on_result(email_data, False, message)
     
     finally:
-        # Close SMTP connection
-        if smtp_connection:
-            try:
-                smtp_connection.quit()
-                logger.info("SMTP connection closed")
-            except Exception as e:
-                logger.warning(f"Error closing SMTP connection: {str(e)}")
+        # Close pooled SMTP connections
+        pool.close()
         
         # Mark campaign as completed
         if campaign_id and campaign_id in campaign_progress:
-            # Ensure progress shows 100% (total_emails) and send this update first
-            campaign_progress[campaign_id]['progress'] = len(email_data_list)
+            # Ensure progress shows 100% (total_emails); completion is marked by the caller
+            campaign_progress[campaign_id]['progress'] = total_emails
             campaign_progress[campaign_id]['status'] = 'Campaign completed'
             campaign_progress[campaign_id]['activity'] = f'Campaign finished. Total: {len(results)} emails processed'
             campaign_progress[campaign_id]['activity_type'] = 'success'
-            
-            # Small delay to ensure the progress update is sent before marking as completed
-            time.sleep(0.1)
+            notify_progress(campaign_id)
     
     return results
 
 
-def personalize_content(template, row_data):
-    """Replace placeholders in template with actual data from CSV row."""
-    content = template
-    for key, value in row_data.items():
-        placeholder = f"{{{key}}}"
-        content = content.replace(placeholder, str(value))
-    return content
+def get_campaign_log_path(campaign_id):
+    """Return the on-disk CSV log path for a campaign."""
+    return os.path.join(app.config['LOGS_FOLDER'], f"{secure_filename(campaign_id)}.csv")
+
+
+def cleanup_old_logs(retention_days=LOG_RETENTION_DAYS):
+    """Delete campaign logs older than the retention period."""
+    cutoff = time.time() - retention_days * 86400
+    try:
+        for filename in os.listdir(app.config['LOGS_FOLDER']):
+            filepath = os.path.join(app.config['LOGS_FOLDER'], filename)
+            if filename.endswith('.csv') and os.path.getmtime(filepath) < cutoff:
+                os.remove(filepath)
+                logger.info(f"Removed expired campaign log {filename}")
+    except Exception as e:
+        logger.warning(f"Error cleaning up campaign logs: {str(e)}")
+
+
+def compile_template(template, placeholder_idx, placeholder_pattern):
+    """Turn a {column} template into a str.format string with positional fields.
+    
+    Braces that aren't column placeholders (CSS, unknown names) are escaped so they
+    come through unchanged.
+    """
+    parts = []
+    last_end = 0
+    for match in placeholder_pattern.finditer(template):
+        parts.append(template[last_end:match.start()].replace('{', '{{').replace('}', '}}'))
+        parts.append(f"{{{placeholder_idx[match.group(1)]}}}")
+        last_end = match.end()
+    parts.append(template[last_end:].replace('{', '{{').replace('}', '}}'))
+    return ''.join(parts)
+
+
+def personalize_content(compiled_template, row_values, column_count):
+    """Fill a compiled template with values from a CSV row list in a single pass."""
+    if len(row_values) < column_count:
+        row_values = list(row_values) + [''] * (column_count - len(row_values))
+    return compiled_template.format(*row_values)
 
 
 def save_template(name, subject, body, sender_name=''):
     """Save an email template to the templates folder."""
     try:
+        now = datetime.now().isoformat()
         template_data = {
             'name': name,
             'subject': subject,
             'body': body,
             'sender_name': sender_name,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
+            'created_at': now,
+            'updated_at': now
         }
         
         # Create safe filename
-        safe_name = re.sub(r'[^a-zA-Z0-9_-]', '_', name)
+        safe_name = UNSAFE_FILENAME_CHARS_RE.sub('_', name)
         filename = f"{safe_name}.json"
         filepath = os.path.join(app.config['TEMPLATES_FOLDER'], filename)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(template_data, f, indent=2, ensure_ascii=False)
+        write_json_file(filepath, template_data)
+        
+        update_template_index(filename, template_data)
         
         # Add filename to template data for frontend
         template_data['filename'] = filename
@@ -387,41 +1033,128 @@ def save_template(name, subject, body, sender_name=''):
         return False, f"Error saving template: {str(e)}"
 
 
+def get_template_index_path():
+    """Return the path of the index summarizing saved templates."""
+    return os.path.join(app.config['TEMPLATES_FOLDER'], TEMPLATE_INDEX_FILENAME)
+
+
+def template_summary(filename, template_data):
+    """Return the template fields shown in template listings."""
+    return {
+        'filename': filename,
+        'name': template_data.get('name', ''),
+        'subject': template_data.get('subject', ''),
+        'sender_name': template_data.get('sender_name', ''),
+        'created_at': template_data.get('created_at', ''),
+        'updated_at': template_data.get('updated_at', '')
+    }
+
+
+def write_template_index(entries):
+    """Atomically replace the template index."""
+    index_path = get_template_index_path()
+    # Per-thread temp file so concurrent writers never share one
+    tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write_json_file(tmp_path, entries)
+    os.replace(tmp_path, index_path)
+    # Stamp the index with the folder mtime its own replace produced, so templates
+    # added later (git pull, manual copies) make the folder newer than the index
+    folder_mtime = os.stat(app.config['TEMPLATES_FOLDER']).st_mtime_ns
+    os.utime(index_path, ns=(folder_mtime, folder_mtime))
+
+
+def rebuild_template_index():
+    """Scan the templates folder once and write a fresh index."""
+    # Hold the lock for scan and write so a concurrent save or delete can't be overwritten
+    with _template_index_lock:
+        entries = []
+        templates_dir = app.config['TEMPLATES_FOLDER']
+        for filename in os.listdir(templates_dir):
+            if filename.endswith('.json') and not filename.startswith('.'):
+                try:
+                    filepath = os.path.join(templates_dir, filename)
+                    entries.append(template_summary(filename, read_json_file(filepath)))
+                except Exception as e:
+                    logger.warning(f"Error reading template {filename}: {str(e)}")
+                    continue
+        
+        write_template_index(entries)
+    logger.info(f"Rebuilt template index with {len(entries)} templates")
+    return entries
+
+
+@functools.lru_cache(maxsize=1)
+def _read_template_index_file(index_path, inode, mtime_ns, size):
+    """Parse the template index; cached until the file is replaced or changes."""
+    return read_json_file(index_path)
+
+
+def read_template_index():
+    """Return the template index entries, rebuilding the index if it is missing or unreadable."""
+    index_path = get_template_index_path()
+    try:
+        stat = os.stat(index_path)
+        # Templates added or removed outside the app leave the folder newer than the index
+        if os.stat(app.config['TEMPLATES_FOLDER']).st_mtime_ns > stat.st_mtime_ns:
+            return rebuild_template_index()
+        entries = _read_template_index_file(index_path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        # Indexes written before created_at was tracked are rebuilt once
+        if any('created_at' not in entry for entry in entries):
+            return rebuild_template_index()
+        # Callers sort and annotate the entries, so hand out copies of the cached list
+        return [dict(entry) for entry in entries]
+    except FileNotFoundError:
+        return rebuild_template_index()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Template index unreadable, rebuilding: {str(e)}")
+        return rebuild_template_index()
+
+
+def update_template_index(filename, template_data=None):
+    """Replace a template's index entry, or remove it when ``template_data`` is None."""
+    with _template_index_lock:
+        entries = [entry for entry in read_template_index() if entry.get('filename') != filename]
+        if template_data is not None:
+            entries.append(template_summary(filename, template_data))
+        write_template_index(entries)
+
+
+@functools.lru_cache(maxsize=128)
+def _read_template_file(filepath, mtime):
+    """Parse a template file; cached per (path, mtime) so edits are picked up."""
+    return read_json_file(filepath)
+
+
 def load_template(filename):
     """Load an email template from the templates folder."""
     try:
         filepath = os.path.join(app.config['TEMPLATES_FOLDER'], filename)
-        with open(filepath, 'r', encoding='utf-8') as f:
-            template_data = json.load(f)
+        template_data = dict(_read_template_file(filepath, os.path.getmtime(filepath)))
         return True, template_data
     except Exception as e:
         logger.error(f"Error loading template: {str(e)}")
         return False, f"Error loading template: {str(e)}"
 
 
-def list_templates():
-    """List all saved email templates."""
+def list_templates(include_body=False):
+    """List all saved email templates.
+    
+    Listings come from the template index; pass ``include_body`` to also load each
+    template's body from its own file.
+    """
     try:
-        templates = []
-        templates_dir = app.config['TEMPLATES_FOLDER']
-        
-        if not os.path.exists(templates_dir):
+        if not os.path.exists(app.config['TEMPLATES_FOLDER']):
             return []
         
-        for filename in os.listdir(templates_dir):
-            if filename.endswith('.json'):
-                try:
-                    filepath = os.path.join(templates_dir, filename)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        template_data = json.load(f)
-                    template_data['filename'] = filename
-                    templates.append(template_data)
-                except Exception as e:
-                    logger.warning(f"Error reading template {filename}: {str(e)}")
-                    continue
+        templates = read_template_index()
         
         # Sort by updated_at (most recent first)
         templates.sort(key=lambda x: x.get('updated_at', ''), reverse=True)
+        
+        if include_body:
+            for template in templates:
+                success, template_data = load_template(template['filename'])
+                template['body'] = template_data.get('body', '') if success else ''
         return templates
     except Exception as e:
         logger.error(f"Error listing templates: {str(e)}")
@@ -434,6 +1167,7 @@ def delete_template(filename):
         filepath = os.path.join(app.config['TEMPLATES_FOLDER'], filename)
         if os.path.exists(filepath):
             os.remove(filepath)
+            update_template_index(filename)
             return True, "Template deleted successfully"
         else:
             return False, "Template not found"
@@ -442,19 +1176,83 @@ def delete_template(filename):
         return False, f"Error deleting template: {str(e)}"
 
 
-# Pydantic models for structured AI response
-class EmailImprovementResponse(BaseModel):
-    improved_subject: str
-    improved_body: str
-    spam_suggestions: List[str]
-    general_improvements: List[str]
-    spam_score_assessment: str
-    deliverability_tips: List[str]
+def get_text_embedding(text):
+    """Return an embedding vector for text, or None if semantic caching is unavailable."""
+    azure_openai_client = get_azure_openai_client()
+    if not azure_openai_client or not AZURE_OPENAI_EMBEDDING_DEPLOYMENT:
+        return None
+    try:
+        response = azure_openai_client.embeddings.create(
+            model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+            input=text
+        )
+        return response.data[0].embedding
+    except Exception as e:
+        logger.warning(f"Embedding request failed, skipping semantic cache: {str(e)}")
+        return None
+
+
+def cosine_similarity(vector_a, vector_b):
+    """Compute the cosine similarity of two equal-length vectors."""
+    dot = sum(a * b for a, b in zip(vector_a, vector_b))
+    norm_a = sum(a * a for a in vector_a) ** 0.5
+    norm_b = sum(b * b for b in vector_b) ** 0.5
+    if not norm_a or not norm_b:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+def get_cached_email_improvement(subject: str, body: str, context: str):
+    """
+    Look up a previous AI improvement for this draft.
+    
+    Returns ``(result, embedding)``: ``result`` is None on a cache miss, and ``embedding``
+    is the draft's embedding (when available) so the eventual response can be cached.
+    """
+    cache_key = (subject, body, context)
+    with _ai_cache_lock:
+        cached = _ai_response_cache.get(cache_key)
+        if cached is not None:
+            _ai_response_cache.move_to_end(cache_key)
+            logger.info("AI improvement served from exact-match cache")
+            return dict(cached), None
+    
+    embedding = get_text_embedding(f"{subject}\n{body}\n{context}")
+    if embedding is not None:
+        with _ai_cache_lock:
+            candidates = list(_ai_semantic_cache)
+        best_score, best_response = 0.0, None
+        for cached_embedding, cached_response in candidates:
+            score = cosine_similarity(embedding, cached_embedding)
+            if score > best_score:
+                best_score, best_response = score, cached_response
+        if best_response is not None and best_score >= AI_SEMANTIC_CACHE_THRESHOLD:
+            logger.info(f"AI improvement served from semantic cache (similarity {best_score:.3f})")
+            return dict(best_response), embedding
+    
+    return None, embedding
+
+
+def cache_email_improvement(subject: str, body: str, context: str, embedding, result: dict):
+    """Store a successful AI improvement in the exact-match and semantic caches."""
+    cache_key = (subject, body, context)
+    with _ai_cache_lock:
+        _ai_response_cache[cache_key] = result
+        _ai_response_cache.move_to_end(cache_key)
+        while len(_ai_response_cache) > AI_CACHE_SIZE:
+            _ai_response_cache.popitem(last=False)
+        if embedding is not None:
+            _ai_semantic_cache.append((embedding, result))
+            del _ai_semantic_cache[:-AI_SEMANTIC_CACHE_SIZE]
 
 
 def improve_email_with_ai(subject: str, body: str, context: str = "") -> dict:
     """
-    Use Azure OpenAI to improve email content and provide spam-proofing suggestions.
+    Use Azure OpenAI to improve email content, reusing cached responses when possible.
+    
+    Identical requests are answered from an in-memory LRU cache. When
+    AZURE_OPENAI_EMBEDDING_DEPLOYMENT is configured, near-identical drafts are also
+    answered from a semantic cache of previous responses.
     
     Args:
         subject: Email subject line
@@ -465,20 +1263,75 @@ def improve_email_with_ai(subject: str, body: str, context: str = "") -> dict:
         dict: Contains improved_subject, improved_body, spam_suggestions, general_improvements,
               spam_score_assessment, and deliverability_tips.
     """
-    if not azure_openai_client:
+    if not get_azure_openai_client():
         return {
             'success': False,
             'error': 'AI service is not available. Please check Azure OpenAI configuration.'
         }
     
-    # Test connection first
-    connection_ok, connection_msg = test_azure_openai_connection()
-    if not connection_ok:
-        return {
+    cached, embedding = get_cached_email_improvement(subject, body, context)
+    if cached is not None:
+        return cached
+    
+    result = _request_email_improvement(subject, body, context)
+    
+    # Only cache successful responses so transient errors are retried
+    if result.get('success'):
+        cache_email_improvement(subject, body, context, embedding, result)
+        return dict(result)
+    
+    return result
+
+
+def stream_email_improvement(subject: str, body: str, context: str = ""):
+    """
+    Stream an AI improvement while Azure OpenAI generates it.
+    
+    Yields ``('delta', text)`` for each chunk of the model's JSON response, then one
+    ``('result', dict)`` shaped like the return value of improve_email_with_ai.
+    Cached improvements are yielded as a result straight away.
+    """
+    azure_openai_client = get_azure_openai_client()
+    if not azure_openai_client:
+        yield 'result', {
+            'success': False,
+            'error': 'AI service is not available. Please check Azure OpenAI configuration.'
+        }
+        return
+    
+    cached, embedding = get_cached_email_improvement(subject, body, context)
+    if cached is not None:
+        yield 'result', cached
+        return
+    
+    chunks = []
+    try:
+        logger.info(f"Streaming Azure OpenAI API call to deployment: {AZURE_OPENAI_DEPLOYMENT_NAME}")
+        stream = azure_openai_client.chat.completions.create(
+            **build_email_improvement_request(subject, body, context),
+            stream=True
+        )
+        for chunk in stream:
+            # Azure sends content-filter chunks without choices
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield 'delta', chunks[-1]
+    except Exception as e:
+        yield 'result', {
             'success': False,
-            'error': f'Azure OpenAI connection failed: {connection_msg}'
+            'error': describe_azure_openai_error(e)
         }
+        return
     
+    result = parse_email_improvement(''.join(chunks))
+    if result.get('success'):
+        cache_email_improvement(subject, body, context, embedding, result)
+        result = dict(result)
+    yield 'result', result
+
+
+def build_email_improvement_request(subject: str, body: str, context: str) -> dict:
+    """Build the chat completion arguments for an email improvement request."""
     prompt = f"""
 Analyze and improve the following email.
 Preserve placeholders like {{name}}.
@@ -491,79 +1344,97 @@ Body: {body}
 Additional Context: {context if context else "General mass email campaign"}
 """
 
-    try:
-        logger.info(f"Making Azure OpenAI API call to deployment: {AZURE_OPENAI_DEPLOYMENT_NAME}")
-        
-        # Use regular completions.create instead of beta.parse
-        completion = azure_openai_client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT_NAME,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert email marketing consultant. Provide concise improvements for the email. Keep your response short and focused. Return a valid JSON object with these keys: improved_subject, improved_body, spam_suggestions (max 3 items), general_improvements (max 3 items), spam_score_assessment (one sentence), and deliverability_tips (max 2 items)."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            response_format={"type": "json_object"},
-            max_tokens=2000,
-            temperature=0.3 
-        )
-
-        # Parse the JSON response manually
-        ai_response_content = completion.choices[0].message.content
-        logger.info(f"Raw AI response content: {ai_response_content[:300]}...")
+    return {
+        'model': AZURE_OPENAI_DEPLOYMENT_NAME,
+        'messages': [
+            {
+                "role": "system",
+                "content": "You are an expert email marketing consultant. Provide concise improvements for the email. Keep your response short and focused. Return a valid JSON object with these keys: improved_subject, improved_body, spam_suggestions (max 3 items), general_improvements (max 3 items), spam_score_assessment (one sentence), and deliverability_tips (max 2 items)."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        'response_format': {"type": "json_object"},
+        'max_tokens': 2000,
+        'temperature': 0.3
+    }
 
-        try:
-            # Parse the JSON string
-            parsed_json = json.loads(ai_response_content)
-            
-            # Validate that the response contains all required fields
-            required_fields = ["improved_subject", "improved_body", "spam_suggestions", 
-                              "general_improvements", "spam_score_assessment", "deliverability_tips"]
-            
-            missing_fields = [field for field in required_fields if field not in parsed_json]
-            
-            if missing_fields:
-                return {
-                    'success': False,
-                    'error': f"AI response missing required fields: {', '.join(missing_fields)}",
-                    'raw_response': ai_response_content
-                }
-            
-            # Add success flag and return
-            parsed_json['success'] = True
-            return parsed_json
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse AI response as JSON: {str(e)}")
+def parse_email_improvement(ai_response_content: str) -> dict:
+    """Parse and validate the JSON returned by the model."""
+    logger.info(f"Raw AI response content: {ai_response_content[:300]}...")
+    
+    try:
+        # Parse the JSON string
+        parsed_json = json_loads(ai_response_content)
+        
+        # Validate that the response contains all required fields
+        required_fields = ["improved_subject", "improved_body", "spam_suggestions", 
+                          "general_improvements", "spam_score_assessment", "deliverability_tips"]
+        
+        missing_fields = [field for field in required_fields if field not in parsed_json]
+        
+        if missing_fields:
             return {
                 'success': False,
-                'error': f"Failed to parse AI response as JSON: {str(e)}",
+                'error': f"AI response missing required fields: {', '.join(missing_fields)}",
                 'raw_response': ai_response_content
             }
+        
+        # Add success flag and return
+        parsed_json['success'] = True
+        return parsed_json
+    
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse AI response as JSON: {str(e)}")
+        return {
+            'success': False,
+            'error': f"Failed to parse AI response as JSON: {str(e)}",
+            'raw_response': ai_response_content
+        }
 
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Error calling Azure OpenAI API: {error_msg}", exc_info=True)
+
+def describe_azure_openai_error(error):
+    """Log an Azure OpenAI API error and return a user-facing explanation."""
+    error_msg = str(error)
+    logger.error(f"Error calling Azure OpenAI API: {error_msg}", exc_info=True)
+    
+    # Provide more specific error messages
+    if "404" in error_msg:
+        return f"Deployment '{AZURE_OPENAI_DEPLOYMENT_NAME}' not found in Azure OpenAI resource. Please verify the deployment name in Azure OpenAI Studio."
+    elif "401" in error_msg:
+        return "Authentication failed. Please check your API key in the .env file."
+    elif "403" in error_msg:
+        return "Access forbidden. Please check your Azure OpenAI resource permissions."
+    elif "429" in error_msg:
+        return "Rate limit exceeded. Please try again later."
+    else:
+        return f"API call failed: {error_msg}"
+
+
+def _request_email_improvement(subject: str, body: str, context: str) -> dict:
+    """Call Azure OpenAI for an email improvement without consulting the cache.
+    
+    No separate connection test is made first; failures of the real call are mapped
+    to the same user-facing messages by describe_azure_openai_error.
+    """
+    try:
+        logger.info(f"Making Azure OpenAI API call to deployment: {AZURE_OPENAI_DEPLOYMENT_NAME}")
         
-        # Provide more specific error messages
-        if "404" in error_msg:
-            detailed_error = f"Deployment '{AZURE_OPENAI_DEPLOYMENT_NAME}' not found in Azure OpenAI resource. Please verify the deployment name in Azure OpenAI Studio."
-        elif "401" in error_msg:
-            detailed_error = "Authentication failed. Please check your API key in the .env file."
-        elif "403" in error_msg:
-            detailed_error = "Access forbidden. Please check your Azure OpenAI resource permissions."
-        elif "429" in error_msg:
-            detailed_error = "Rate limit exceeded. Please try again later."
-        else:
-            detailed_error = f"API call failed: {error_msg}"
+        # Use regular completions.create instead of beta.parse
+        completion = get_azure_openai_client().chat.completions.create(
+            **build_email_improvement_request(subject, body, context)
+        )
         
+        # Parse the JSON response manually
+        return parse_email_improvement(completion.choices[0].message.content)
+    
+    except Exception as e:
         return {
             'success': False,
-            'error': detailed_error
+            'error': describe_azure_openai_error(e)
         }
 
 
@@ -591,22 +1462,20 @@ def upload_file():
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
         
-        # Validate CSV
-        is_valid, result = validate_csv(filepath)
-        if not is_valid:
-            flash(f'Invalid CSV file: {result}')
+        # Validate CSV and count rows for rate limiting estimation in a single pass
+        try:
+            with open_validated_csv(filepath) as (columns, rows):
+                csv_count = sum(1 for _ in rows)
+        except Exception as e:
+            flash(f'Invalid CSV file: {str(e)}')
             os.remove(filepath)  # Clean up invalid file
             return redirect(url_for('index'))
         
-        # Get CSV data count for rate limiting estimation
-        csv_data = read_csv_data(filepath)
-        csv_count = len(csv_data) if csv_data else 0
-        
         # Store file info in session or pass to next page
         templates = list_templates()
         return render_template('compose.html', 
                              filename=filename, 
-                             columns=result,
+                             columns=columns,
                              filepath=filepath,
                              templates=templates,
                              csv_count=csv_count)
@@ -631,122 +1500,155 @@ def send_emails():
         rate_limit_delay = int(request.form.get('rate_limit_delay', EMAIL_RATE_LIMIT_DELAY))
         batch_size = int(request.form.get('batch_size', EMAIL_BATCH_SIZE))
         batch_delay = int(request.form.get('batch_delay', EMAIL_BATCH_DELAY))
+        # Client input may lower the SMTP connection count but never exceed the server's limit
+        max_workers = max(1, min(int(request.form.get('max_workers', EMAIL_MAX_WORKERS)), EMAIL_MAX_WORKERS))
         
         # Validate inputs
         if not all([filepath, sender_email, subject_template, body_template, email_column]):
             flash('All fields are required')
             return redirect(url_for('index'))
         
-        # Read CSV data
-        csv_data = read_csv_data(filepath)
-        if not csv_data:
-            flash('Error reading CSV data')
-            return redirect(url_for('index'))
-        
         # Initialize campaign
         campaign_id = datetime.now().strftime('%Y%m%d_%H%M%S')
         start_time = datetime.now()
         
-        # Calculate estimated duration
-        total_emails = len(csv_data)
-        estimated_duration = calculate_estimated_duration(total_emails, rate_limit_delay, batch_size, batch_delay)
-        
-        # Prepare email data for batch sending
-        email_data_list = []
-        failures = []
-        
-        logger.info(f"Starting email campaign {campaign_id} with {len(csv_data)} recipients")
-        
-        for row_index, row in enumerate(csv_data, 1):
-            recipient_email = row.get(email_column)
+        # Open the CSV once: validate the header and stream rows into the send list
+        with open_validated_csv(filepath) as (headers, rows):
+            if email_column not in headers:
+                flash('Error reading CSV data')
+                return redirect(url_for('index'))
             
-            if not recipient_email:
-                error_msg = f"Row {row_index}: Missing email address"
-                failures.append(error_msg)
-                continue
+            placeholder_idx = build_placeholder_index(headers)
+            placeholder_pattern = compile_placeholder_pattern(headers)
+            email_idx = placeholder_idx[email_column]
             
-            # Personalize subject and body
-            personalized_subject = personalize_content(subject_template, row)
-            personalized_body = personalize_content(body_template, row)
+            # Identical emails for every row can share one SMTP transaction per group of recipients
+            needs_personalization = bool(placeholder_pattern.search(subject_template) or
+                                         placeholder_pattern.search(body_template))
+            recipients_per_message = 1 if needs_personalization else EMAIL_RECIPIENTS_PER_MESSAGE
             
-            # Add to batch email list
-            email_data_list.append({
-                'recipient': recipient_email,
-                'subject': personalized_subject,
-                'body': personalized_body,
-                'row_index': row_index
-            })
+            # Strip HTML from the template once instead of from every personalized body
+            plain_body_template = html_to_plain_text(body_template)
+            
+            # Compile templates once so each row is filled in a single str.format pass
+            column_count = len(headers)
+            compiled_subject = compile_template(subject_template, placeholder_idx, placeholder_pattern)
+            compiled_body = compile_template(body_template, placeholder_idx, placeholder_pattern)
+            compiled_plain_body = compile_template(plain_body_template, placeholder_idx, placeholder_pattern)
+            
+            # Validate rows up front; personalized emails are only built while sending
+            failures = []
+            skipped_rows = set()
+            first_row_for_recipient = {}
+            first_row = None
+            total_emails = 0
+            
+            for row_index, row in enumerate(rows, 1):
+                total_emails = row_index
+                if first_row is None:
+                    first_row = row
+                
+                recipient_email = row[email_idx].strip() if email_idx < len(row) else ''
+                
+                # Skip rows that would only be rejected by the server or send a second copy
+                if not recipient_email:
+                    error_msg = f"Row {row_index}: Missing email address"
+                elif not EMAIL_ADDRESS_RE.fullmatch(recipient_email):
+                    error_msg = f"Row {row_index}: Invalid email address {recipient_email}"
+                else:
+                    first_seen = first_row_for_recipient.setdefault(recipient_email.lower(), row_index)
+                    if first_seen == row_index:
+                        continue
+                    error_msg = f"Row {row_index}: Duplicate email address {recipient_email} (already in row {first_seen})"
+                failures.append(error_msg)
+                skipped_rows.add(row_index)
+        
+        send_count = total_emails - len(failures)
+        
+        def iter_email_data():
+            """Re-read the CSV and personalize each row just before it is sent."""
+            with open_validated_csv(filepath) as (_, rows):
+                for row_index, row in enumerate(rows, 1):
+                    if row_index in skipped_rows:
+                        continue
+                    recipient_email = row[email_idx].strip()
+                    
+                    # Personalize subject and body; identical emails share the template strings
+                    if needs_personalization:
+                        personalized_subject = personalize_content(compiled_subject, row, column_count)
+                        personalized_body = personalize_content(compiled_body, row, column_count)
+                        personalized_plain_body = personalize_content(compiled_plain_body, row, column_count)
+                    else:
+                        personalized_subject = subject_template
+                        personalized_body = body_template
+                        personalized_plain_body = plain_body_template
+                    
+                    yield {
+                        'recipient': recipient_email,
+                        'subject': personalized_subject,
+                        'body': personalized_body,
+                        'plain_body': personalized_plain_body,
+                        'row_index': row_index
+                    }
+        if first_row is None:
+            flash('Error reading CSV data')
+            return redirect(url_for('index'))
+        
+        logger.info(f"Starting email campaign {campaign_id} with {total_emails} recipients")
+        
+        # Calculate estimated duration
+        estimated_duration = calculate_estimated_duration(total_emails, rate_limit_delay, batch_size, batch_delay)
         
         # Show progress page immediately
-        subject_preview = personalize_content(subject_template, csv_data[0] if csv_data else {})
+        subject_preview = personalize_content(compiled_subject, first_row, column_count)
         
         # Start email sending in background thread
-        if email_data_list:
+        if send_count:
             def send_emails_background():
                 try:
-                    batch_results = send_batch_emails_with_progress(
-                        SMTP_SERVER, SMTP_PORT, sender_email, email_data_list, 
-                        sender_name, rate_limit_delay, batch_size, batch_delay, campaign_id
-                    )
-                    
-                    # Brief pause to ensure final progress update is sent before completion
-                    time.sleep(0.5)
-                    
-                    # Mark campaign as completed immediately after batch sending
-                    if campaign_id in campaign_progress:
-                        campaign_progress[campaign_id]['completed'] = True
-                    
-                    # Process results and create logs
-                    email_log = []
-                    success_count = 0
-                    failure_count = len(failures)  # Pre-processing failures
-                    
-                    for i, (success, message, recipient_email) in enumerate(batch_results):
-                        email_data = email_data_list[i]
-                        row_index = email_data['row_index']
-                        timestamp = datetime.now().isoformat()
+                    # Write the campaign log as emails complete so it survives a crash mid-campaign
+                    with open(get_campaign_log_path(campaign_id), 'w', newline='', encoding='utf-8') as log_file:
+                        log_writer = csv.writer(log_file)
+                        log_writer.writerow(CAMPAIGN_LOG_FIELDS)
                         
-                        # Log the email attempt
-                        log_entry = {
-                            'campaign_id': campaign_id,
-                            'timestamp': timestamp,
-                            'row_number': row_index,
-                            'recipient_email': recipient_email,
-                            'subject': email_data['subject'],
-                            'status': 'SUCCESS' if success else 'FAILED',
-                            'error_message': '' if success else message,
-                            'sender_email': sender_email,
-                            'sender_name': sender_name
-                        }
-                        email_log.append(log_entry)
+                        send_failures = []
+                        success_count = 0
                         
-                        if success:
-                            success_count += 1
-                        else:
-                            failure_count += 1
+                        def log_result(email_data, success, message):
+                            nonlocal success_count
+                            if success:
+                                success_count += 1
+                            else:
+                                send_failures.append(f"Row {email_data['row_index']}: {message}")
+                            log_writer.writerow((campaign_id, datetime.now().isoformat(), email_data['row_index'],
+                                                 email_data['recipient'], email_data['subject'],
+                                                 'SUCCESS' if success else 'FAILED', '' if success else message,
+                                                 sender_email, sender_name))
+                        
+                        send_batch_emails_with_progress(
+                            SMTP_SERVER, SMTP_PORT, sender_email, iter_email_data(), 
+                            sender_name, rate_limit_delay, batch_size, batch_delay, campaign_id,
+                            max_workers, recipients_per_message, on_result=log_result,
+                            total_emails=send_count, identical_emails=not needs_personalization
+                        )
+                        
+                        # Add pre-processing failures to log
+                        logged_at = datetime.now().isoformat()
+                        log_writer.writerows((campaign_id, logged_at, 'N/A', 'N/A', 'N/A',
+                                              'FAILED', failure, sender_email, sender_name)
+                                             for failure in failures)
                     
-                    # Add pre-processing failures to log
-                    for failure in failures:
-                        email_log.append({
-                            'campaign_id': campaign_id,
-                            'timestamp': datetime.now().isoformat(),
-                            'row_number': 'N/A',
-                            'recipient_email': 'N/A',
-                            'subject': 'N/A',
-                            'status': 'FAILED',
-                            'error_message': failure,
-                            'sender_email': sender_email,
-                            'sender_name': sender_name
-                        })
+                    # Results were tallied by log_result as each email completed
+                    failure_count = len(send_failures) + len(failures)
                     
                     # Store results for later retrieval
                     end_time = datetime.now()
                     duration = end_time - start_time
                     
-                    app.config[f'CAMPAIGN_RESULTS_{campaign_id}'] = {
+                    results = {
                         'success_count': success_count,
                         'failure_count': failure_count,
-                        'failures': [f"Row {email_data_list[i]['row_index']}: {message}" for i, (success, message, _) in enumerate(batch_results) if not success] + failures,
+                        'failures': send_failures + failures,
                         'campaign_id': campaign_id,
                         'duration': duration.total_seconds(),
                         'total_emails': success_count + failure_count,
@@ -756,18 +1658,22 @@ def send_emails():
                             'batch_delay': batch_delay
                         }
                     }
+                    store_campaign_results(campaign_id, results)
                     
-                    # Store email log
-                    app.config['LAST_EMAIL_LOG'] = email_log
-                    app.config['LAST_CAMPAIGN_ID'] = campaign_id
+                    # Drop logs from campaigns past the retention period
+                    cleanup_old_logs()
                     
                     # Clean up uploaded file
                     if os.path.exists(filepath):
                         os.remove(filepath)
                     
-                    # Store results for later retrieval and update progress tracking
+                    # Publish results and completion together so streams never see one without the other
                     if campaign_id in campaign_progress:
-                        campaign_progress[campaign_id]['results'] = app.config[f'CAMPAIGN_RESULTS_{campaign_id}']
+                        campaign_progress[campaign_id].update(
+                            results=results,
+                            completed=True
+                        )
+                        notify_progress(campaign_id)
                     
                     logger.info(f"Campaign {campaign_id} completed: {success_count} successful, {failure_count} failed")
                     
@@ -776,16 +1682,29 @@ def send_emails():
                     if campaign_id in campaign_progress:
                         campaign_progress[campaign_id]['error'] = str(e)
                         campaign_progress[campaign_id]['completed'] = True
+                        notify_progress(campaign_id)
+                    store_campaign_results(campaign_id, None)
             
-            # Start background thread
-            thread = threading.Thread(target=send_emails_background)
-            thread.daemon = True
-            thread.start()
+            # Show the campaign as queued until a campaign slot is free
+            campaign_progress[campaign_id] = {
+                'progress': 0,
+                'success_count': 0,
+                'failure_count': 0,
+                'total_emails': send_count,
+                'status': 'Waiting for other campaigns to finish...',
+                'activity': 'Campaign queued',
+                'activity_type': 'info',
+                'current_email': '',
+                'start_time': start_time
+            }
+            campaign_control[campaign_id] = CampaignControl()
+            notify_progress(campaign_id)
+            campaign_executor.submit(send_emails_background)
         
         # Return progress page immediately
         return render_template('progress.html',
                              campaign_id=campaign_id,
-                             total_emails=len(email_data_list),
+                             total_emails=send_count,
                              sender_email=sender_email,
                              subject_preview=subject_preview,
                              start_time=start_time.strftime('%Y-%m-%d %H:%M:%S'),
@@ -829,74 +1748,73 @@ def calculate_estimated_duration(total_emails, rate_limit_delay, batch_size, bat
         return f"{hours}h {minutes}m"
 
 
-def prepare_data_for_json(data):
-    """Convert datetime objects to strings for JSON serialization."""
-    if isinstance(data, dict):
-        result = {}
-        for key, value in data.items():
-            if isinstance(value, datetime):
-                result[key] = value.isoformat()
-            elif isinstance(value, dict):
-                result[key] = prepare_data_for_json(value)
-            elif isinstance(value, list):
-                result[key] = [prepare_data_for_json(item) if isinstance(item, (dict, datetime)) else item for item in value]
-            else:
-                result[key] = value
-        return result
-    elif isinstance(data, datetime):
-        return data.isoformat()
-    else:
-        return data
+def gzip_event_stream(events):
+    """Gzip a stream of SSE text frames, flushing after each frame so none is held back."""
+    compressor = zlib.compressobj(level=1, wbits=31)  # wbits=31 selects the gzip container
+    for event in events:
+        yield compressor.compress(event.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
 
 
 @app.route('/progress_stream/<campaign_id>')
 def progress_stream(campaign_id):
     """Server-Sent Events stream for progress updates."""
     def event_stream():
-        last_update = {}
+        last_version = 0
+        condition = campaign_events.get(campaign_id)
+        if condition is None:
+            yield f"event: error\ndata: {json_dumps({'error': 'Campaign not found or expired', 'campaign_id': campaign_id})}\n\n"
+            return
+        
+        def changed():
+            return campaign_payloads.get(campaign_id, (0,))[0] != last_version
         
         while True:
-            if campaign_id in campaign_progress:
-                current_data = campaign_progress[campaign_id].copy()
+            # Read the entry once; forget_campaign may evict it at any point
+            entry = campaign_payloads.get(campaign_id)
+            if entry is None and last_version:
+                yield f"event: error\ndata: {json_dumps({'error': 'Campaign not found or expired', 'campaign_id': campaign_id})}\n\n"
+                break
+            
+            # Only send update if data has changed
+            if entry is not None and entry[0] != last_version:
+                last_version, current_data, payload = entry
+                
+                # Always send progress update first (even if completed)
+                yield f"data: {payload}\n\n"
                 
-                # Only send update if data has changed
-                if current_data != last_update:
-                    # Always send progress update first (even if completed)
-                    if not current_data.get('completed'):
-                        # Prepare data for JSON serialization (convert datetime objects)
-                        json_safe_data = prepare_data_for_json(current_data)
-                        yield f"data: {json.dumps(json_safe_data)}\n\n"
+                if current_data.get('completed'):
+                    # Then send completion event
+                    if current_data.get('error'):
+                        yield f"event: error\ndata: {json_dumps({'error': current_data['error'], 'campaign_id': campaign_id})}\n\n"
                     else:
-                        # Send final progress update before completion event
-                        json_safe_data = prepare_data_for_json(current_data)
-                        yield f"data: {json.dumps(json_safe_data)}\n\n"
-                        
-                        # Then send completion event
-                        if current_data.get('error'):
-                            yield f"event: error\ndata: {json.dumps({'error': current_data['error'], 'campaign_id': campaign_id})}\n\n"
-                        else:
-                            results = current_data.get('results', {})
-                            yield f"event: complete\ndata: {json.dumps({'campaign_id': campaign_id, 'success_count': results.get('success_count', 0), 'failure_count': results.get('failure_count', 0)})}\n\n"
-                        break
-                    
-                    last_update = current_data.copy()
+                        results = current_data.get('results', {})
+                        yield f"event: complete\ndata: {json_dumps({'campaign_id': campaign_id, 'success_count': results.get('success_count', 0), 'failure_count': results.get('failure_count', 0)})}\n\n"
+                    break
             
-            time.sleep(1)  # Update every second
+            # Sleep until the campaign reports a change, with periodic keep-alives; the
+            # predicate also catches changes made while this stream was yielding
+            with condition:
+                woken = condition.wait_for(changed, timeout=PROGRESS_KEEPALIVE_SECONDS)
+            if not woken:
+                yield ": keep-alive\n\n"
     
-    return Response(event_stream(), mimetype="text/event-stream")
+    # Progress frames repeat most of their fields, so compress them for clients that accept gzip
+    if request.accept_encodings['gzip']:
+        headers = dict(SSE_HEADERS, **{'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'})
+        return Response(gzip_event_stream(event_stream()), mimetype="text/event-stream", headers=headers)
+    return Response(event_stream(), mimetype="text/event-stream", headers=SSE_HEADERS)
 
 
 @app.route('/results/<campaign_id>')
 def campaign_results(campaign_id):
     """Show results for a specific campaign."""
-    results_key = f'CAMPAIGN_RESULTS_{campaign_id}'
+    results = get_campaign_results(campaign_id)
     
-    if results_key not in app.config:
+    if results is None:
         flash('Campaign results not found or expired')
         return redirect(url_for('index'))
     
-    results = app.config[results_key]
-    
     return render_template('results.html', **results)
 
 
@@ -904,8 +1822,9 @@ def campaign_results(campaign_id):
 def pause_campaign(campaign_id):
     """Pause an ongoing email campaign."""
     try:
-        if campaign_id in campaign_control:
-            campaign_control[campaign_id]['paused'] = True
+        control = campaign_control.get(campaign_id)
+        if control is not None:
+            control.pause()
             return jsonify({'success': True, 'message': 'Campaign paused'})
         else:
             return jsonify({'success': False, 'error': 'Campaign not found'})
@@ -918,8 +1837,9 @@ def pause_campaign(campaign_id):
 def resume_campaign(campaign_id):
     """Resume a paused email campaign."""
     try:
-        if campaign_id in campaign_control:
-            campaign_control[campaign_id]['paused'] = False
+        control = campaign_control.get(campaign_id)
+        if control is not None:
+            control.resume()
             return jsonify({'success': True, 'message': 'Campaign resumed'})
         else:
             return jsonify({'success': False, 'error': 'Campaign not found'})
@@ -932,8 +1852,9 @@ def resume_campaign(campaign_id):
 def stop_campaign(campaign_id):
     """Stop an ongoing email campaign."""
     try:
-        if campaign_id in campaign_control:
-            campaign_control[campaign_id]['stopped'] = True
+        control = campaign_control.get(campaign_id)
+        if control is not None:
+            control.stop()
             return jsonify({'success': True, 'message': 'Campaign stopped'})
         else:
             return jsonify({'success': False, 'error': 'Campaign not found'})
@@ -951,17 +1872,21 @@ def preview_email():
         body_template = request.form.get('body')
         
         # Read first row of CSV
-        csv_data = read_csv_data(filepath)
-        if csv_data:
-            first_row = csv_data[0]
-            preview_subject = personalize_content(subject_template, first_row)
-            preview_body = personalize_content(body_template, first_row)
+        with open_validated_csv(filepath) as (headers, rows):
+            first_row = next(rows, None)
+        if first_row:
+            placeholder_idx = build_placeholder_index(headers)
+            placeholder_pattern = compile_placeholder_pattern(headers)
+            preview_subject = personalize_content(
+                compile_template(subject_template, placeholder_idx, placeholder_pattern), first_row, len(headers))
+            preview_body = personalize_content(
+                compile_template(body_template, placeholder_idx, placeholder_pattern), first_row, len(headers))
             
             return jsonify({
                 'success': True,
                 'subject': preview_subject,
                 'body': preview_body,
-                'sample_data': first_row
+                'sample_data': dict(zip(headers, first_row))
             })
         else:
             return jsonify({'success': False, 'error': 'No data in CSV file'})
@@ -974,41 +1899,19 @@ def preview_email():
 def download_log(campaign_id):
     """Download email campaign log as CSV file."""
     try:
-        # Get the email log from app config
-        email_log = app.config.get('LAST_EMAIL_LOG', [])
-        stored_campaign_id = app.config.get('LAST_CAMPAIGN_ID', '')
+        # Locate the campaign log on disk
+        log_path = get_campaign_log_path(campaign_id)
         
-        if not email_log or campaign_id != stored_campaign_id:
+        if not os.path.exists(log_path):
             flash('Email log not found or expired')
             return redirect(url_for('index'))
         
-        # Create CSV content
-        output = io.StringIO()
-        fieldnames = [
-            'campaign_id', 'timestamp', 'row_number', 'recipient_email', 
-            'subject', 'status', 'error_message', 'sender_email', 'sender_name'
-        ]
-        
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(email_log)
-        
-        # Create response
-        csv_content = output.getvalue()
-        output.close()
-        
-        # Create file-like object for download
-        csv_buffer = io.BytesIO()
-        csv_buffer.write(csv_content.encode('utf-8'))
-        csv_buffer.seek(0)
-        
-        filename = f'email_campaign_log_{campaign_id}.csv'
-        
+        # The log is already CSV on disk, so serve it as-is
         return send_file(
-            csv_buffer,
+            os.path.abspath(log_path),
+            mimetype='text/csv',
             as_attachment=True,
-            download_name=filename,
-            mimetype='text/csv'
+            download_name=f'email_campaign_log_{campaign_id}.csv'
         )
         
     except Exception as e:
@@ -1068,7 +1971,7 @@ def delete_template_route(filename):
 @app.route('/templates')
 def templates_page():
     """Show templates management page."""
-    templates = list_templates()
+    templates = list_templates(include_body=True)
     return render_template('templates.html', templates=templates)
 
 
@@ -1090,7 +1993,7 @@ def improve_email_route():
             })
         
         # Check if AI service is available
-        if not azure_openai_client:
+        if not get_azure_openai_client():
             return jsonify({
                 'success': False,
                 'error': 'AI service is currently unavailable. Please check the Azure OpenAI configuration.'
@@ -1111,11 +2014,37 @@ def improve_email_route():
         })
 
 
+@app.route('/improve_email_stream', methods=['POST'])
+def improve_email_stream():
+    """Stream an AI improvement to the browser as server-sent events while it is generated."""
+    subject = request.form.get('subject', '').strip()
+    body = request.form.get('body', '').strip()
+    context = request.form.get('context', '').strip()
+    
+    logger.info(f"AI improvement stream request - Subject: {subject[:50]}..., Body length: {len(body)}")
+    
+    if not subject or not body:
+        return jsonify({
+            'success': False, 
+            'error': 'Both subject and body are required for AI improvement'
+        })
+    
+    def event_stream():
+        for kind, payload in stream_email_improvement(subject, body, context):
+            if kind == 'delta':
+                yield f"data: {json_dumps({'delta': payload})}\n\n"
+            else:
+                logger.info(f"AI improvement result: success={payload.get('success', False)}")
+                yield f"event: complete\ndata: {json_dumps(payload)}\n\n"
+    
+    return Response(event_stream(), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
 @app.route('/debug/azure_openai')
 def debug_azure_openai():
     """Debug route to test Azure OpenAI configuration."""
     debug_info = {
-        'client_initialized': azure_openai_client is not None,
+        'client_initialized': get_azure_openai_client() is not None,
         'api_key_set': bool(AZURE_OPENAI_API_KEY),
         'endpoint': AZURE_OPENAI_ENDPOINT,
         'api_version': AZURE_OPENAI_API_VERSION,
@@ -1123,8 +2052,8 @@ def debug_azure_openai():
         'connection_test': None
     }
     
-    if azure_openai_client:
-        success, message = test_azure_openai_connection()
+    if debug_info['client_initialized']:
+        success, message = get_azure_openai_connection_status()
         debug_info['connection_test'] = {
             'success': success,
             'message': message
@@ -1140,12 +2069,13 @@ if __name__ == '__main__':
                        help='Port to run the Flask application on (default: 5000)')
     parser.add_argument('--host', type=str, default='0.0.0.0',
                        help='Host to bind the Flask application to (default: 0.0.0.0)')
-    parser.add_argument('--debug', action='store_true', default=True,
-                       help='Run Flask in debug mode (default: True)')
+    parser.add_argument('--debug', action='store_true', default=False,
+                       help='Run Flask in debug mode (default: False)')
     
     args = parser.parse_args()
     
     print(f"Starting Mass Email Sender on {args.host}:{args.port}")
     print(f"Debug mode: {args.debug}")
     
-    app.run(debug=args.debug, host=args.host, port=args.port)
+    # Development server only; use gunicorn -c gunicorn.conf.py app:app in production
+    app.run(debug=args.debug, host=args.host, port=args.port, threaded=True)
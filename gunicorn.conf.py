@@ -0,0 +1,23 @@
+"""
+Gunicorn configuration for running the Mass Email Sender in production.
+
+Usage:
+  gunicorn -c gunicorn.conf.py app:app
+
+Campaign progress, pause/stop controls and SSE streams live in process memory,
+so a single worker process is used and concurrency comes from threads.
+"""
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = 1
+threads = int(os.getenv('GUNICORN_THREADS', 16))  # each open progress page holds one thread
+
+# Import the app and its settings before serving requests; the Azure OpenAI client
+# is still created lazily, on first use in each worker
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
@@ -10,9 +10,17 @@ Usage:
 """
 
 import os
+import re
 import sys
+import json
+import time
+import hashlib
+import functools
+from collections import namedtuple
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from openai import AzureOpenAI, DefaultHttpxClient
 import logging
 
 # Setup logging
@@ -22,6 +30,70 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Successful probes are remembered for this long so repeated runs skip the API call
+PROBE_CACHE_FILE = '.azure_probe_cache.json'
+PROBE_CACHE_SECONDS = 600
+
+# Host suffixes of public Azure OpenAI and Azure AI Services endpoints
+AZURE_ENDPOINT_SUFFIXES = ('.openai.azure.com', '.cognitiveservices.azure.com')
+DEPLOYMENT_NAME_RE = re.compile(r'[A-Za-z0-9._-]+')
+
+AzureConfig = namedtuple('AzureConfig', ['api_key', 'endpoint', 'api_version', 'deployment_name'])
+
+@functools.lru_cache(maxsize=1)
+def get_config():
+    """Read the Azure OpenAI settings from the environment once per run."""
+    env = os.environ.copy()
+    return AzureConfig(
+        api_key=env.get('AZURE_OPENAI_API_KEY'),
+        endpoint=env.get('AZURE_OPENAI_ENDPOINT'),
+        api_version=env.get('AZURE_OPENAI_API_VERSION', '2024-11-20-preview'),
+        deployment_name=env.get('AZURE_OPENAI_DEPLOYMENT_NAME', 'gpt-4o')
+    )
+
+def validate_config_shape(endpoint, deployment_name):
+    """Cheaply reject malformed settings before building a client."""
+    parsed = urlparse(endpoint)
+    if parsed.scheme != 'https' or not parsed.hostname:
+        return False, f"Endpoint '{endpoint}' should look like https://<resource>.openai.azure.com/"
+    # Sovereign clouds and API Management gateways use other hosts, so only warn
+    if not parsed.hostname.endswith(AZURE_ENDPOINT_SUFFIXES):
+        print(f"⚠️  Endpoint host '{parsed.hostname}' is not a public Azure OpenAI host; "
+              "continuing in case it is a sovereign cloud or gateway endpoint")
+    if not DEPLOYMENT_NAME_RE.fullmatch(deployment_name):
+        return False, f"Deployment name '{deployment_name}' may only contain letters, digits, '.', '_' and '-'"
+    return True, None
+
+def probe_cache_key(config):
+    """Key a cached probe result on everything that affects the API call."""
+    raw = f"{config.endpoint}:{config.api_version}:{config.deployment_name}:{config.api_key}:hello"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+def probe_recently_succeeded(key):
+    """Return True if a successful probe with this key is still within the TTL."""
+    try:
+        with open(PROBE_CACHE_FILE, 'r') as f:
+            succeeded_at = json.load(f).get(key)
+    except (OSError, ValueError):
+        return False
+    return succeeded_at is not None and time.time() - succeeded_at < PROBE_CACHE_SECONDS
+
+def remember_probe_success(key):
+    """Record a successful probe, dropping entries that have expired."""
+    now = time.time()
+    try:
+        with open(PROBE_CACHE_FILE, 'r') as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = {}
+    entries = {k: t for k, t in entries.items() if now - t < PROBE_CACHE_SECONDS}
+    entries[key] = now
+    try:
+        with open(PROBE_CACHE_FILE, 'w') as f:
+            json.dump(entries, f)
+    except OSError as e:
+        logger.warning(f"Could not write probe cache: {str(e)}")
+
 def test_azure_openai_config():
     """Test Azure OpenAI configuration step by step."""
     
@@ -29,30 +101,48 @@ def test_azure_openai_config():
     print("=" * 50)
     
     # Check environment variables
-    api_key = os.getenv('AZURE_OPENAI_API_KEY')
-    endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
-    api_version = os.getenv('AZURE_OPENAI_API_VERSION', '2024-11-20-preview')
-    deployment_name = os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME', 'gpt-4o')
+    config = get_config()
+    api_key = config.api_key
+    endpoint = config.endpoint
+    api_version = config.api_version
+    deployment_name = config.deployment_name
     
-    print("📋 Configuration Check:")
-    print(f"  ✓ API Key: {'✅ Set' if api_key else '❌ Missing'}")
-    print(f"  ✓ Endpoint: {endpoint if endpoint else '❌ Missing'}")
-    print(f"  ✓ API Version: {api_version}")
-    print(f"  ✓ Deployment Name: {deployment_name}")
-    print()
+    out = [
+        "📋 Configuration Check:",
+        f"  ✓ API Key: {'✅ Set' if api_key else '❌ Missing'}",
+        f"  ✓ Endpoint: {endpoint if endpoint else '❌ Missing'}",
+        f"  ✓ API Version: {api_version}",
+        f"  ✓ Deployment Name: {deployment_name}",
+        ""
+    ]
+    sys.stdout.write("\n".join(out) + "\n")
     
     if not api_key or not endpoint:
         print("❌ Missing required environment variables!")
         print("Please check your .env file and ensure AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT are set.")
         return False
     
+    valid, error = validate_config_shape(endpoint, deployment_name)
+    if not valid:
+        print(f"❌ Invalid configuration: {error}")
+        print("Please check AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_DEPLOYMENT_NAME in your .env file.")
+        return False
+    
+    cache_key = probe_cache_key(config)
+    if probe_recently_succeeded(cache_key):
+        print("✅ cached OK: the same configuration passed within the last "
+              f"{PROBE_CACHE_SECONDS // 60} minutes, skipping the API call")
+        return True
+    
     # Test client initialization
     print("🔧 Testing Client Initialization...")
     try:
+        # Transient 429/5xx/connection errors are retried with exponential backoff
         client = AzureOpenAI(
             api_key=api_key,
             api_version=api_version,
-            azure_endpoint=endpoint
+            azure_endpoint=endpoint,
+            max_retries=3
         )
         print("  ✅ Client initialized successfully")
     except Exception as e:
@@ -74,6 +164,7 @@ def test_azure_openai_config():
         if response.choices and response.choices[0].message:
             print("  ✅ API call successful!")
             print(f"  📝 Response: {response.choices[0].message.content}")
+            remember_probe_success(cache_key)
             return True
         else:
             print("  ❌ API call returned empty response")
@@ -155,18 +246,30 @@ def list_common_deployment_names():
     print("💡 Latest models may require newer API versions (2025-xx-xx-preview)")
     print("💡 Use o3, o4-mini for reasoning tasks, gpt-4.5 for general improvements")
 
+@functools.lru_cache(maxsize=1)
+def get_probe_http_client():
+    """Return the HTTP connection pool shared by all API version probes."""
+    return DefaultHttpxClient()
+
+@functools.lru_cache(maxsize=32)
+def get_probe_client(api_key, endpoint, api_version):
+    """Return a cached client for one API version; all of them share one connection pool."""
+    return AzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        http_client=get_probe_http_client()
+    )
+
 def quick_api_version_test(api_version_to_test):
     """Quickly test if an API version works by making a minimal API call."""
-    api_key = os.getenv('AZURE_OPENAI_API_KEY')
-    endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
-    deployment_name = os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME', 'gpt-4o')
+    config = get_config()
+    api_key = config.api_key
+    endpoint = config.endpoint
+    deployment_name = config.deployment_name
     
     try:
-        client = AzureOpenAI(
-            api_key=api_key,
-            api_version=api_version_to_test,
-            azure_endpoint=endpoint
-        )
+        client = get_probe_client(api_key, endpoint, api_version_to_test)
         
         # Try a very minimal API call
         response = client.chat.completions.create(
@@ -200,9 +303,10 @@ def test_api_versions():
         "2024-02-01"
     ]
     
-    api_key = os.getenv('AZURE_OPENAI_API_KEY')
-    endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
-    deployment_name = os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME', 'gpt-4o')
+    config = get_config()
+    api_key = config.api_key
+    endpoint = config.endpoint
+    deployment_name = config.deployment_name
     
     if not api_key or not endpoint:
         print("  ❌ Cannot test API versions without API key and endpoint")
@@ -210,14 +314,18 @@ def test_api_versions():
     
     print("📋 Recommended API Versions to try:")
     working_versions = []
+    versions = api_versions_to_test[:5]
     
-    for i, version in enumerate(api_versions_to_test[:5], 1):
-        print(f"  {i}. {version} ... ", end="", flush=True)
-        if quick_api_version_test(version):
-            print("✅ Works")
-            working_versions.append(version)
-        else:
-            print("❌ Failed")
+    # Probe all versions at once; results are still reported in list order
+    with ThreadPoolExecutor(max_workers=len(versions)) as executor:
+        outcomes = executor.map(quick_api_version_test, versions)
+        for i, (version, works) in enumerate(zip(versions, outcomes), 1):
+            print(f"  {i}. {version} ... ", end="", flush=True)
+            if works:
+                print("✅ Works")
+                working_versions.append(version)
+            else:
+                print("❌ Failed")
     
     if working_versions:
         print(f"\n✅ Found {len(working_versions)} working API version(s):")
@@ -227,7 +335,7 @@ def test_api_versions():
     else:
         print("\n❌ No working API versions found in quick test")
         print("💡 This might indicate a deployment name or authentication issue")
-        print(f"\n💡 Current version in use: {os.getenv('AZURE_OPENAI_API_VERSION', '2024-11-20-preview')}")
+        print(f"\n💡 Current version in use: {config.api_version}")
         print("💡 To change API version, update AZURE_OPENAI_API_VERSION in your .env file")
         print("💡 Preview versions have latest features but may be less stable")
         print("💡 Non-preview versions are more stable for production use")
@@ -13,36 +13,32 @@ from datetime import datetime
 # Add the app directory to path to import app modules
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# Log columns and their header row, built once since the schema is fixed
+FIELDNAMES = (
+    'campaign_id', 'timestamp', 'row_number', 'recipient_email', 
+    'subject', 'status', 'error_message', 'sender_email', 'sender_name'
+)
+HEADER_LINE = ",".join(FIELDNAMES) + "\r\n"
+
 def test_csv_logging():
     """Test the CSV logging functionality"""
     print("🧪 Testing CSV Logging Functionality")
     print("=" * 50)
     
     # Mock email log data
-    campaign_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    now = datetime.now()
+    campaign_id = now.strftime('%Y%m%d_%H%M%S')
+    timestamp = now.isoformat()
+    sender_email = 'admin@cuhk.edu.hk'
+    sender_name = 'Admin Team'
+    # Only these columns vary per row; the rest are shared by the whole campaign
+    variable_cols = [
+        ('test1@example.com', 'Welcome John Doe!', 'SUCCESS', ''),
+        ('invalid@email', 'Welcome Jane Smith!', 'FAILED', 'Invalid email address')
+    ]
     email_log = [
-        {
-            'campaign_id': campaign_id,
-            'timestamp': datetime.now().isoformat(),
-            'row_number': 1,
-            'recipient_email': 'test1@example.com',
-            'subject': 'Welcome John Doe!',
-            'status': 'SUCCESS',
-            'error_message': '',
-            'sender_email': 'admin@cuhk.edu.hk',
-            'sender_name': 'Admin Team'
-        },
-        {
-            'campaign_id': campaign_id,
-            'timestamp': datetime.now().isoformat(),
-            'row_number': 2,
-            'recipient_email': 'invalid@email',
-            'subject': 'Welcome Jane Smith!',
-            'status': 'FAILED',
-            'error_message': 'Invalid email address',
-            'sender_email': 'admin@cuhk.edu.hk',
-            'sender_name': 'Admin Team'
-        }
+        (campaign_id, timestamp, i, email, subject, status, error, sender_email, sender_name)
+        for i, (email, subject, status, error) in enumerate(variable_cols, 1)
     ]
     
     print(f"✅ Campaign ID: {campaign_id}")
@@ -50,13 +46,10 @@ def test_csv_logging():
     
     # Test CSV generation
     output = io.StringIO()
-    fieldnames = [
-        'campaign_id', 'timestamp', 'row_number', 'recipient_email', 
-        'subject', 'status', 'error_message', 'sender_email', 'sender_name'
-    ]
     
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
+    # Rows are already tuples in FIELDNAMES order
+    output.write(HEADER_LINE)
+    writer = csv.writer(output)
     writer.writerows(email_log)
     
     csv_content = output.getvalue()
@@ -72,10 +65,17 @@ def test_csv_logging():
     print(f"✅ Test file saved: {test_filename}")
     
     # Verify file content
-    with open(test_filename, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-        
+    with open(test_filename, 'r', newline='', encoding='utf-8') as f:
+        saved_content = f.read()
+    if saved_content != csv_content:
+        raise ValueError(f"{test_filename} does not match the generated CSV content")
+    
+    rows = list(csv.DictReader(io.StringIO(saved_content)))
+    if len(rows) != len(email_log):
+        raise ValueError(f"{test_filename} has {len(rows)} rows, expected {len(email_log)}")
+    if tuple(rows[0]) != FIELDNAMES:
+        raise ValueError(f"{test_filename} header does not match FIELDNAMES")
+    
     print(f"✅ Verified {len(rows)} rows in CSV file")
     
     # Display sample content
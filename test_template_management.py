@@ -1,12 +1,27 @@
 # Template Management Test Script
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Test the template management system
 BASE_URL = "http://localhost:5000"
 
+# One keep-alive connection pool for every request the tests make
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+def parse_json(response):
+    """Decode a JSON response body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
 def test_template_management():
     """Test template saving, loading, and deletion."""
     
@@ -24,47 +39,29 @@ def test_template_management():
     try:
         # Test 1: Save template
         print("📝 Test 1: Saving template...")
-        response = requests.post(f"{BASE_URL}/save_template", data=test_template)
-        result = response.json()
+        response = SESSION.post(f"{BASE_URL}/save_template", data=test_template)
+        result = parse_json(response)
         
         if result.get('success'):
             print("✅ Template saved successfully!")
+            test_filename = result['template']['filename']
         else:
             print(f"❌ Failed to save template: {result.get('error')}")
             return False
             
-        # Test 2: List templates (check if our template appears)
-        print("\n📋 Test 2: Checking if template appears in list...")
+        # Test 2: Check the saved template file exists on disk
+        print("\n📋 Test 2: Checking if template was written to disk...")
         templates_dir = "templates_saved"
-        if os.path.exists(templates_dir):
-            template_files = [f for f in os.listdir(templates_dir) if f.endswith('.json')]
-            print(f"Found {len(template_files)} template files:")
-            for file in template_files:
-                print(f"  - {file}")
-            
-            # Find our test template
-            test_filename = None
-            for file in template_files:
-                filepath = os.path.join(templates_dir, file)
-                with open(filepath, 'r') as f:
-                    template_data = json.load(f)
-                    if template_data.get('name') == test_template['template_name']:
-                        test_filename = file
-                        break
-            
-            if test_filename:
-                print(f"✅ Test template found: {test_filename}")
-            else:
-                print("❌ Test template not found in saved templates")
-                return False
+        if os.path.exists(os.path.join(templates_dir, test_filename)):
+            print(f"✅ Test template found: {test_filename}")
         else:
-            print("❌ Templates directory not found")
+            print("❌ Test template not found in saved templates")
             return False
             
         # Test 3: Load template
         print(f"\n📥 Test 3: Loading template '{test_filename}'...")
-        response = requests.get(f"{BASE_URL}/load_template/{test_filename}")
-        result = response.json()
+        response = SESSION.get(f"{BASE_URL}/load_template/{test_filename}")
+        result = parse_json(response)
         
         if result.get('success'):
             loaded_template = result.get('template')
@@ -87,8 +84,8 @@ def test_template_management():
             
         # Test 4: Delete template
         print(f"\n🗑️ Test 4: Deleting template '{test_filename}'...")
-        response = requests.post(f"{BASE_URL}/delete_template/{test_filename}")
-        result = response.json()
+        response = SESSION.post(f"{BASE_URL}/delete_template/{test_filename}")
+        result = parse_json(response)
         
         if result.get('success'):
             print("✅ Template deleted successfully!")
@@ -120,7 +117,8 @@ def test_templates_page():
     print("=" * 50)
     
     try:
-        response = requests.get(f"{BASE_URL}/templates")
+        # Only the status matters; Flask answers HEAD for every GET route without sending the body
+        response = SESSION.head(f"{BASE_URL}/templates", allow_redirects=True)
         if response.status_code == 200:
             print("✅ Templates page loads successfully!")
             return True